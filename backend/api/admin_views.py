@@ -0,0 +1,28 @@
+from django.contrib import admin
+from django.http import Http404, HttpResponse
+from django.shortcuts import render
+
+from . import profiling
+
+
+def profiles_view(request):
+    """Список последних профилей запросов для админки"""
+    return render(request, 'admin/profiles.html', {
+        **admin.site.each_context(request),
+        'title': 'Профили запросов',
+        'profiles': profiling.get_profiles(),
+    })
+
+
+def profile_view(request, profile_id):
+    """Профиль запроса в формате collapsed"""
+    collapsed = profiling.get_profile(profile_id)
+    if collapsed is None:
+        raise Http404
+    response = HttpResponse(
+        collapsed, content_type='text/plain; charset=utf-8'
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="profile_{profile_id}.collapsed"'
+    )
+    return response
@@ -4,3 +4,14 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from .metrics import DB_CONNECTIONS
+
+        connection_created.connect(
+            lambda sender, connection, **kwargs:
+            DB_CONNECTIONS.inc(connection.alias),
+            weak=False
+        )
@@ -0,0 +1,96 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .metrics import CACHE_REQUESTS
+
+
+class Call:
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Объединяет одновременные вызовы с одинаковым ключом.
+
+    Функцию выполняет только первый вызов, остальные потоки ждут его
+    завершения и получают тот же результат или то же исключение.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def do(self, key, func):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = Call()
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = func()
+        except Exception as error:
+            call.error = error
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.event.set()
+        return call.result
+
+
+single_flight = SingleFlight()
+
+
+def get_or_compute(key, func, timeout=None):
+    """Возвращает значение из кеша или вычисляет его один раз.
+
+    Внутри процесса одновременные промахи объединяются SingleFlight.
+    Между процессами, использующими общий кеш, вычисление защищено
+    блокировкой cache.add(): остальные процессы ждут появления значения
+    в кеше, но не дольше COALESCING_LOCK_TIMEOUT секунд.
+    """
+    value = cache.get(key)
+    name = key.split(':', 1)[0]
+    if value is not None:
+        CACHE_REQUESTS.inc(name, 'hit')
+        return value
+    CACHE_REQUESTS.inc(name, 'miss')
+    if timeout is None:
+        timeout = settings.RESPONSE_CACHE_TIMEOUT
+
+    def compute():
+        lock_key = f'{key}:lock'
+        lock_timeout = settings.COALESCING_LOCK_TIMEOUT
+        deadline = time.monotonic() + lock_timeout
+        locked = cache.add(lock_key, 1, lock_timeout)
+        while not locked:
+            value = cache.get(key)
+            if value is not None:
+                return value
+            if time.monotonic() > deadline:
+                break
+            time.sleep(0.05)
+            locked = cache.add(lock_key, 1, lock_timeout)
+        try:
+            value = cache.get(key)
+            if value is None:
+                value = func()
+                cache.set(key, value, timeout)
+            return value
+        finally:
+            if locked:
+                cache.delete(lock_key)
+
+    return single_flight.do(key, compute)
@@ -0,0 +1,100 @@
+import gzip
+
+from django.conf import settings
+from django.utils.cache import has_vary_header
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSIBLE_TYPES = (
+    'text/', 'application/json', 'application/javascript',
+    'application/xml',
+)
+
+
+def compress_gzip(data):
+    return gzip.compress(data, compresslevel=6, mtime=0)
+
+
+def compress_brotli(data):
+    return brotli.compress(data, quality=5)
+
+
+def compress_zstd(data):
+    return zstandard.ZstdCompressor(level=3).compress(data)
+
+
+# Кодировки в порядке предпочтения сервера; brotli и zstd доступны,
+# только если установлены соответствующие пакеты.
+ENCODERS = {
+    name: compressor for name, compressor in (
+        ('br', brotli and compress_brotli),
+        ('zstd', zstandard and compress_zstd),
+        ('gzip', compress_gzip),
+    ) if compressor
+}
+
+
+def parse_accept_encoding(header):
+    """Возвращает словарь {кодировка: q} из заголовка Accept-Encoding."""
+    accepted = {}
+    for item in header.split(','):
+        name, *params = item.strip().split(';')
+        quality = 1.0
+        for param in params:
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name:
+            accepted[name.lower()] = quality
+    return accepted
+
+
+def choose_encoding(header):
+    """Выбирает кодировку с наибольшим q среди поддерживаемых, при
+    равных q - в порядке предпочтения сервера. Возвращает None, если
+    клиент не принимает ни одну из них."""
+    accepted = parse_accept_encoding(header or '')
+    default = accepted.get('*', 0.0)
+    best, best_quality = None, 0.0
+    for name in ENCODERS:
+        quality = accepted.get(name, default)
+        if quality > best_quality:
+            best, best_quality = name, quality
+    return best
+
+
+def is_compressible(response):
+    content_type = response.get('Content-Type', '').lower()
+    return (
+        not response.streaming
+        and not response.has_header('Content-Encoding')
+        and content_type.startswith(COMPRESSIBLE_TYPES)
+        and len(response.content) >= settings.COMPRESSION_MIN_SIZE
+    )
+
+
+def is_cacheable(response):
+    """Можно ли хранить сжатое тело в общем кеше: только JSON без
+    cookie и без зависимости от cookie (Vary: Cookie), иначе тело может
+    относиться к одному клиенту."""
+    content_type = response.get('Content-Type', '').lower()
+    return (
+        content_type.startswith('application/json')
+        and not response.cookies
+        and not has_vary_header(response, 'Cookie')
+    )
+
+
+def compress(data, encoding):
+    return ENCODERS[encoding](data)
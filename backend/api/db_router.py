@@ -0,0 +1,123 @@
+import itertools
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+PIN_COOKIE = 'primary_pin'
+PIN_COOKIE_SALT = 'api.db_router.pin'
+
+# Состояние маршрутизации текущего HTTP-запроса, None вне запроса.
+routing_state = ContextVar('routing_state', default=None)
+
+
+def pin_to_primary(response):
+    """Направляет чтения клиента на основную БД в течение
+    REPLICA_STICKINESS_TIMEOUT секунд после записи.
+
+    Закрепление хранится в подписанной cookie, а не в кеше, поэтому
+    оно видно всем процессам и не зависит от IP-адреса клиента.
+    """
+    response.set_signed_cookie(
+        PIN_COOKIE, '1', salt=PIN_COOKIE_SALT,
+        max_age=settings.REPLICA_STICKINESS_TIMEOUT,
+        httponly=True, samesite='Lax'
+    )
+
+
+def is_pinned(request):
+    """Срок закрепления проверяется по времени подписи, поэтому
+    сохранённая клиентом старая cookie не действует."""
+    return request.get_signed_cookie(
+        PIN_COOKIE, default=None, salt=PIN_COOKIE_SALT,
+        max_age=settings.REPLICA_STICKINESS_TIMEOUT
+    ) is not None
+
+
+class RoutingState:
+    """БД для чтения в рамках одного запроса.
+
+    Реплика выбирается при первом чтении и не меняется до конца
+    запроса, чтобы все его запросы видели согласованные данные.
+    После первой записи чтения переключаются на основную БД, а флаг
+    wrote сообщает ReplicaMiddleware, что клиента нужно закрепить,
+    даже если запрос был безопасным (например, GET, создающий
+    фоновую задачу).
+    """
+    __slots__ = ('request', 'alias', 'wrote')
+
+    def __init__(self, request, primary):
+        self.request = request
+        self.alias = DEFAULT_DB_ALIAS if primary else None
+        self.wrote = False
+
+
+class ReplicaRouter:
+    """Направляет чтения безопасных запросов на реплики.
+
+    Запись, небезопасные запросы, запросы клиентов, недавно выполнявших
+    запись, чтения после записи в том же запросе и всё, что выполняется
+    вне HTTP-запроса (команды, фоновые задачи), работают с основной БД.
+    Реплики перебираются по кругу; реплика, к которой не удалось
+    подключиться, исключается на REPLICA_RETRY_INTERVAL секунд, а при
+    недоступности всех реплик чтение идёт с основной БД.
+    """
+
+    def __init__(self):
+        self.replicas = settings.DATABASE_REPLICAS
+        self.cycle = itertools.cycle(self.replicas)
+        self.lock = threading.Lock()
+        self.unhealthy = {}
+
+    def is_healthy(self, alias):
+        retry_at = self.unhealthy.get(alias)
+        if retry_at is None:
+            return True
+        if time.monotonic() < retry_at:
+            return False
+        self.unhealthy.pop(alias, None)
+        return True
+
+    def check(self, alias):
+        try:
+            connections[alias].ensure_connection()
+        except DatabaseError:
+            self.unhealthy[alias] = (
+                time.monotonic() + settings.REPLICA_RETRY_INTERVAL
+            )
+            return False
+        return True
+
+    def get_replica(self):
+        for _ in range(len(self.replicas)):
+            with self.lock:
+                alias = next(self.cycle)
+            if self.is_healthy(alias) and self.check(alias):
+                return alias
+        return DEFAULT_DB_ALIAS
+
+    def db_for_read(self, model, **hints):
+        state = routing_state.get()
+        if state is None or not self.replicas:
+            return DEFAULT_DB_ALIAS
+        if state.alias is None:
+            if is_pinned(state.request):
+                state.alias = DEFAULT_DB_ALIAS
+            else:
+                state.alias = self.get_replica()
+        return state.alias
+
+    def db_for_write(self, model, **hints):
+        state = routing_state.get()
+        if state is not None:
+            state.alias = DEFAULT_DB_ALIAS
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in self.replicas
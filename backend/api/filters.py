@@ -1,6 +1,9 @@
+from django.conf import settings
+from django.db.models import Q
 from django_filters import rest_framework as filters
+from rest_framework.exceptions import ValidationError
 
-from recipes.models import Ingredient, Recipe
+from recipes.models import Ingredient, Recipe, User
 
 
 class IngredientFilter(filters.FilterSet):
@@ -18,15 +21,47 @@ class IngredientFilter(filters.FilterSet):
         fields = ('name',)
 
 
+class UserFilter(filters.FilterSet):
+    """Фильтр для пользователей.
+
+    Поиск (?search=) по началу логина, имени, фамилии или почты. Каждое
+    слово запроса должно совпасть с началом одного из этих полей, так
+    что «иван пет» находит Ивана Петрова. Поиск использует индексы
+    UPPER(...) text_pattern_ops.
+    """
+    search = filters.CharFilter(method='filter_search')
+
+    class Meta:
+        model = User
+        fields = ('search',)
+
+    def filter_search(self, queryset, name, value):
+        for word in value.split()[:settings.USER_SEARCH_MAX_WORDS]:
+            queryset = queryset.filter(
+                Q(username__istartswith=word)
+                | Q(first_name__istartswith=word)
+                | Q(last_name__istartswith=word)
+                | Q(email__istartswith=word)
+            )
+        return queryset
+
+
+class NumberInFilter(filters.BaseInFilter, filters.NumberFilter):
+    pass
+
+
 class RecipeFilter(filters.FilterSet):
     """Фильтр для рецептов.
 
+    - Доступна выборка рецептов по списку id (?ids=1,2,3), не более
+      RECIPE_IDS_LIMIT за запрос;
     - Доступна фильтрация по id автора;
     - доступна фильтрация по одному или нескольким тегам по условию ИЛИ.
     - доступна фильтрация по рецептам, находящимся в избранном у пользователя.
     - доступна фильтрация по рецептам, находящимся в списке покупок
       пользователя.
     """
+    ids = NumberInFilter(method='filter_ids')
     author = filters.NumberFilter(field_name='author_id')
     tags = filters.CharFilter(field_name='tags__slug', method='filter_tags')
     is_favorited = filters.NumberFilter(method='filter_favorited')
@@ -34,17 +69,25 @@ class RecipeFilter(filters.FilterSet):
 
     class Meta:
         model = Recipe
-        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart')
+        fields = ('ids', 'author', 'tags', 'is_favorited',
+                  'is_in_shopping_cart')
+
+    def filter_ids(self, queryset, name, value):
+        if len(value) > settings.RECIPE_IDS_LIMIT:
+            raise ValidationError({'ids': [
+                f'Не более {settings.RECIPE_IDS_LIMIT} рецептов за запрос'
+            ]})
+        return queryset.filter(id__in=value)
 
     def filter_favorited(self, queryset, name, value):
         if value == 1 and self.request.user.is_authenticated:
-            return self.request.user.favorites.all()
+            return queryset.filter(user=self.request.user)
         else:
             return queryset
 
     def filter_shopping_cart(self, queryset, name, value):
         if value == 1 and self.request.user.is_authenticated:
-            return self.request.user.shopping_cart.all()
+            return queryset.filter(in_shopping_cart=self.request.user)
         else:
             return queryset
 
@@ -0,0 +1,165 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.mixins import ValuesListModelMixin
+from api.utils import get_cart_summaries
+from api.views import IngredientViewSet, RecipeViewSet, UserViewSet
+from recipes.models import Ingredient, Recipe, Tag, User
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет типовые запросы API с EXPLAIN (ANALYZE, BUFFERS) '
+        'и сообщает о последовательных сканированиях и сортировках на диске'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seq-scan-rows',
+            type=int,
+            default=1000,
+            help='Минимальное число просмотренных строк, при котором '
+                 'последовательное сканирование считается проблемой'
+        )
+        parser.add_argument(
+            '--verbose-plans',
+            action='store_true',
+            help='Выводить полный план каждого запроса'
+        )
+        parser.add_argument(
+            '--fail-on-warnings',
+            action='store_true',
+            help='Завершаться с ошибкой, если найдены проблемы'
+        )
+
+    def get_view_queryset(self, viewset_class, action, query=None,
+                          user=None, **kwargs):
+        """Запрос, который выполняет действие ViewSet на GET-запрос
+        с параметрами query от имени user.
+
+        Запрос строится методами самого ViewSet: get_queryset(),
+        filter_queryset() и, для списков на .values(), get_values_queryset()
+        с ограничением размером страницы.
+        """
+        request = APIRequestFactory().get('/', query or {})
+        if user is not None:
+            force_authenticate(request, user)
+        view = viewset_class(
+            action_map={'get': action}, args=(), kwargs=kwargs,
+            format_kwarg=None
+        )
+        view.request = view.initialize_request(request)
+        queryset = view.get_queryset()
+        if kwargs:
+            lookup_url_kwarg = view.lookup_url_kwarg or view.lookup_field
+            return queryset.filter(
+                **{view.lookup_field: kwargs[lookup_url_kwarg]}
+            )
+        queryset = view.filter_queryset(queryset)
+        if action == 'list' and isinstance(view, ValuesListModelMixin):
+            queryset = view.get_values_queryset(
+                queryset, view.get_values_serializer()
+            )
+        if view.paginator is not None:
+            queryset = queryset[:view.paginator.get_page_size(view.request)]
+        return queryset
+
+    def get_benchmark_queries(self):
+        # Образцы берутся по первичному ключу: ORDER BY random()
+        # просматривает и сортирует всю таблицу.
+        recipe = Recipe.objects.order_by('pk').first()
+        user = User.objects.order_by('pk').first()
+        tag = Tag.objects.order_by('pk').first()
+        ingredient = Ingredient.objects.order_by('pk').first()
+        recipe_id = recipe.id if recipe else 0
+        short_link = recipe.short_link if recipe else ''
+        search = user.username[:3] if user else ''
+        view = self.get_view_queryset
+        return (
+            ('RecipeViewSet.list', view(RecipeViewSet, 'list')),
+            ('RecipeViewSet.list?author',
+             view(RecipeViewSet, 'list',
+                  {'author': recipe.author_id if recipe else 0})),
+            ('RecipeViewSet.list?tags',
+             view(RecipeViewSet, 'list', {'tags': tag.slug if tag else ''})),
+            ('RecipeViewSet.list?is_favorited',
+             view(RecipeViewSet, 'list', {'is_favorited': 1}, user)),
+            ('RecipeViewSet.list?is_in_shopping_cart',
+             view(RecipeViewSet, 'list', {'is_in_shopping_cart': 1}, user)),
+            ('RecipeViewSet.retrieve',
+             view(RecipeViewSet, 'retrieve', pk=recipe_id)),
+            ('RecipeViewSet.download_shopping_cart',
+             get_cart_summaries(user)),
+            ('short_link_redirect',
+             Recipe.objects.filter(short_link=short_link)
+             .values_list('id', flat=True)),
+            ('UserViewSet.list', view(UserViewSet, 'list')),
+            ('UserViewSet.list?search',
+             view(UserViewSet, 'list', {'search': search})),
+            ('UserViewSet.subscriptions',
+             view(UserViewSet, 'subscriptions', user=user)),
+            ('IngredientViewSet.list?name',
+             view(IngredientViewSet, 'list',
+                  {'name': ingredient.name[:3] if ingredient else ''})),
+        )
+
+    def explain(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}', params
+            )
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return plan[0]
+
+    def find_problems(self, plan, seq_scan_rows):
+        problems = []
+        node_type = plan['Node Type']
+        if node_type == 'Seq Scan':
+            rows = (
+                plan.get('Actual Rows', 0) * plan.get('Actual Loops', 1)
+                + plan.get('Rows Removed by Filter', 0)
+            )
+            if rows >= seq_scan_rows:
+                problems.append(
+                    f'последовательное сканирование {plan["Relation Name"]} '
+                    f'({rows} строк)'
+                )
+        if plan.get('Sort Space Type') == 'Disk':
+            problems.append(
+                f'сортировка на диске ({plan.get("Sort Space Used")} kB, '
+                f'ключ {", ".join(plan.get("Sort Key", []))})'
+            )
+        for subplan in plan.get('Plans', ()):
+            problems.extend(self.find_problems(subplan, seq_scan_rows))
+        return problems
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Команда поддерживает только PostgreSQL')
+        warnings = 0
+        for name, queryset in self.get_benchmark_queries():
+            result = self.explain(queryset)
+            problems = self.find_problems(
+                result['Plan'], options['seq_scan_rows']
+            )
+            line = f'{name}: {result["Execution Time"]:.2f} ms'
+            if problems:
+                warnings += len(problems)
+                self.stdout.write(self.style.WARNING(line))
+                for problem in problems:
+                    self.stdout.write(self.style.WARNING(f'  - {problem}'))
+            else:
+                self.stdout.write(self.style.SUCCESS(line))
+            if options['verbose_plans']:
+                self.stdout.write(
+                    queryset.explain(analyze=True, buffers=True)
+                )
+        if warnings and options['fail_on_warnings']:
+            raise CommandError(f'Найдено проблем: {warnings}')
+        self.stdout.write(f'Найдено проблем: {warnings}')
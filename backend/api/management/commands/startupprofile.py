@@ -0,0 +1,137 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+BOOT_SCRIPT = '''
+import json
+import resource
+import time
+
+started = time.perf_counter()
+import foodgram_backend.wsgi  # noqa
+from django.urls import get_resolver
+
+get_resolver().url_patterns
+print(json.dumps({
+    'seconds': time.perf_counter() - started,
+    'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+}))
+'''
+
+
+class Command(BaseCommand):
+    help = (
+        'Измеряет время холодного запуска WSGI-приложения и память '
+        'процесса, выводит самые дорогие импорты'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Количество холодных запусков для замера'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=15,
+            help='Сколько самых дорогих модулей и пакетов выводить'
+        )
+        parser.add_argument(
+            '--no-fast-startup',
+            action='store_true',
+            help='Замерить запуск с отключённым режимом FAST_STARTUP'
+        )
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help='Вывести результат в формате JSON'
+        )
+
+    def boot(self, fast_startup):
+        env = dict(
+            os.environ,
+            FAST_STARTUP=str(fast_startup),
+            DJANGO_SETTINGS_MODULE=os.environ['DJANGO_SETTINGS_MODULE'],
+        )
+        process = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', BOOT_SCRIPT],
+            cwd=settings.BASE_DIR,
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        if process.returncode:
+            raise CommandError(process.stderr)
+        return json.loads(process.stdout.splitlines()[-1]), process.stderr
+
+    @staticmethod
+    def parse_importtime(output):
+        """Разбирает вывод -X importtime в список
+        (модуль, собственное время, суммарное время) в микросекундах."""
+        modules = []
+        for line in output.splitlines():
+            if not line.startswith('import time:') or 'self [us]' in line:
+                continue
+            own, cumulative, name = line[len('import time:'):].split('|')
+            modules.append((name.strip(), int(own), int(cumulative)))
+        return modules
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('--repeat должен быть положительным')
+        fast_startup = not options['no_fast_startup']
+        runs = []
+        for _ in range(options['repeat']):
+            run, importtime = self.boot(fast_startup)
+            runs.append(run)
+        modules = self.parse_importtime(importtime)
+        packages = defaultdict(int)
+        for name, own, _ in modules:
+            packages[name.split('.')[0]] += own
+        limit = options['limit']
+        seconds = [run['seconds'] for run in runs]
+        rss = [run['max_rss_kb'] for run in runs]
+        report = {
+            'fast_startup': fast_startup,
+            'runs': len(runs),
+            'seconds': {
+                'median': statistics.median(seconds),
+                'min': min(seconds),
+                'max': max(seconds),
+            },
+            'max_rss_mb': statistics.median(rss) / 1024,
+            'modules_imported': len(modules),
+            'packages': sorted(
+                packages.items(), key=lambda item: -item[1]
+            )[:limit],
+            'modules': [
+                (name, cumulative) for name, _, cumulative in sorted(
+                    modules, key=lambda module: -module[2]
+                )[:limit]
+            ],
+        }
+        if options['json']:
+            self.stdout.write(json.dumps(report, ensure_ascii=False))
+            return
+        self.stdout.write(
+            f'FAST_STARTUP={fast_startup}, запусков: {len(runs)}\n'
+            f'Холодный запуск: медиана {report["seconds"]["median"]:.3f} с '
+            f'(мин. {report["seconds"]["min"]:.3f} с, '
+            f'макс. {report["seconds"]["max"]:.3f} с)\n'
+            f'Память процесса (max RSS): {report["max_rss_mb"]:.1f} МБ\n'
+            f'Импортировано модулей: {len(modules)}'
+        )
+        self.stdout.write('\nПакеты по собственному времени импорта, мс:')
+        for name, own in report['packages']:
+            self.stdout.write(f'  {own / 1000:8.1f}  {name}')
+        self.stdout.write('\nМодули по суммарному времени импорта, мс:')
+        for name, cumulative in report['modules']:
+            self.stdout.write(f'  {cumulative / 1000:8.1f}  {name}')
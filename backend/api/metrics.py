@@ -0,0 +1,296 @@
+import atexit
+import fcntl
+import json
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+PID_FILENAME = re.compile(r'metrics_(\d+)\.json')
+AGGREGATE_FILENAME = 'metrics_exited.json'
+LOCK_FILENAME = 'metrics.lock'
+
+
+def is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        registry.register(self)
+
+    def inc(self, *labelvalues, amount=1):
+        self.registry.update(self.name, labelvalues, amount)
+
+
+class Histogram(Counter):
+    type = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames=(),
+                 buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        super().__init__(registry, name, documentation, labelnames)
+
+    def observe(self, value, *labelvalues):
+        self.registry.update(
+            self.name, labelvalues, value, bisect_left(self.buckets, value)
+        )
+
+
+class Registry:
+    """Реестр метрик в формате Prometheus.
+
+    Значения накапливаются в памяти процесса. Если задан METRICS_DIR,
+    каждый процесс не чаще раза в METRICS_FLUSH_INTERVAL секунд
+    сохраняет свои значения в файл metrics_<pid>.json, а при выдаче
+    метрик файлы всех воркеров gunicorn суммируются. Значения
+    завершившихся процессов переносятся в общий файл
+    metrics_exited.json: при выходе процесса или, если он был убит,
+    при следующей выдаче метрик. Поэтому каталог не растёт при
+    перезапуске воркеров, а счётчики не уменьшаются. Каталог должен
+    быть своим у каждого контейнера, так как живые процессы
+    определяются по pid.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+        self.values = {}
+        self.next_flush = 0
+        self.pid = None
+        atexit.register(self.retire)
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+
+    def update(self, name, labelvalues, amount, bucket=None):
+        key = (name, labelvalues)
+        with self.lock:
+            value = self.values.get(key)
+            if bucket is None:
+                self.values[key] = (value or 0) + amount
+            else:
+                if value is None:
+                    buckets = len(self.metrics[name].buckets) + 1
+                    value = self.values[key] = [0] * buckets + [0]
+                value[bucket] += 1
+                value[-1] += amount
+        if time.monotonic() >= self.next_flush:
+            self.flush()
+
+    def get_directory(self):
+        return getattr(settings, 'METRICS_DIR', None)
+
+    @staticmethod
+    def get_path(directory, pid):
+        return os.path.join(directory, f'metrics_{pid}.json')
+
+    @staticmethod
+    @contextmanager
+    def directory_lock(directory):
+        """Блокировка каталога метрик между процессами."""
+        with open(os.path.join(directory, LOCK_FILENAME), 'a') as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            yield
+
+    @staticmethod
+    def read(path):
+        try:
+            with open(path) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return []
+
+    @staticmethod
+    def write(path, data):
+        temporary_path = f'{path}.tmp'
+        with open(temporary_path, 'w') as file:
+            json.dump(data, file)
+        os.replace(temporary_path, path)
+
+    @staticmethod
+    def merge(values, data):
+        """Прибавляет к values значения из файла метрик."""
+        for name, labelvalues, value in data:
+            key = (name, tuple(labelvalues))
+            total = values.get(key)
+            if total is None:
+                values[key] = value
+            elif isinstance(value, list):
+                values[key] = [a + b for a, b in zip(total, value)]
+            else:
+                values[key] = total + value
+        return values
+
+    def absorb(self, directory, paths):
+        """Переносит значения файлов paths в metrics_exited.json и
+        удаляет эти файлы. Вызывается под directory_lock()."""
+        aggregate_path = os.path.join(directory, AGGREGATE_FILENAME)
+        values = self.merge({}, self.read(aggregate_path))
+        for path in paths:
+            self.merge(values, self.read(path))
+        self.write(aggregate_path, [
+            [name, list(labelvalues), value]
+            for (name, labelvalues), value in values.items()
+        ])
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def flush(self):
+        """Сохраняет значения текущего процесса в каталог метрик."""
+        directory = self.get_directory()
+        if not directory:
+            self.next_flush = float('inf')
+            return
+        self.next_flush = time.monotonic() + settings.METRICS_FLUSH_INTERVAL
+        pid = os.getpid()
+        path = self.get_path(directory, pid)
+        if self.pid != pid:
+            # Файл с тем же pid мог остаться от процесса, завершившегося
+            # до перезапуска контейнера: его значения не перезаписываются.
+            self.pid = pid
+            if os.path.exists(path):
+                with self.directory_lock(directory):
+                    self.absorb(directory, [path])
+        with self.lock:
+            data = [
+                [name, list(labelvalues), value]
+                for (name, labelvalues), value in self.values.items()
+            ]
+        self.write(path, data)
+
+    def retire(self):
+        """Переносит значения завершающегося процесса в общий файл."""
+        directory = self.get_directory()
+        if not directory:
+            return
+        self.flush()
+        with self.directory_lock(directory):
+            self.absorb(directory, [self.get_path(directory, os.getpid())])
+        with self.lock:
+            self.values.clear()
+
+    def collect(self):
+        """Возвращает значения, просуммированные по всем процессам."""
+        directory = self.get_directory()
+        if not directory:
+            with self.lock:
+                return {
+                    key: list(value) if isinstance(value, list) else value
+                    for key, value in self.values.items()
+                }
+        self.flush()
+        values = {}
+        with self.directory_lock(directory):
+            filenames = os.listdir(directory)
+            dead = []
+            for filename in filenames:
+                match = PID_FILENAME.fullmatch(filename)
+                if match and not is_alive(int(match[1])):
+                    dead.append(os.path.join(directory, filename))
+            if dead:
+                self.absorb(directory, dead)
+                filenames = os.listdir(directory)
+            for filename in filenames:
+                if filename.endswith('.json'):
+                    self.merge(
+                        values, self.read(os.path.join(directory, filename))
+                    )
+        return values
+
+    @staticmethod
+    def format_labels(labelnames, labelvalues, **extra):
+        labels = list(zip(labelnames, labelvalues)) + list(extra.items())
+        if not labels:
+            return ''
+        return '{' + ','.join(
+            '{}="{}"'.format(
+                name,
+                str(value).replace('\\', r'\\').replace('"', r'\"')
+                .replace('\n', r'\n')
+            )
+            for name, value in labels
+        ) + '}'
+
+    def render(self):
+        """Возвращает метрики в текстовом формате Prometheus."""
+        samples = defaultdict(list)
+        for (name, labelvalues), value in sorted(self.collect().items()):
+            samples[name].append((labelvalues, value))
+        lines = []
+        for name, metric in sorted(self.metrics.items()):
+            lines.append(f'# HELP {name} {metric.documentation}')
+            lines.append(f'# TYPE {name} {metric.type}')
+            for labelvalues, value in samples[name]:
+                if metric.type == 'counter':
+                    labels = self.format_labels(metric.labelnames,
+                                                labelvalues)
+                    lines.append(f'{name}{labels} {value}')
+                    continue
+                cumulative = 0
+                bounds = [*metric.buckets, '+Inf']
+                for bound, count in zip(bounds, value):
+                    cumulative += count
+                    labels = self.format_labels(
+                        metric.labelnames, labelvalues, le=bound
+                    )
+                    lines.append(f'{name}_bucket{labels} {cumulative}')
+                labels = self.format_labels(metric.labelnames, labelvalues)
+                lines.append(f'{name}_sum{labels} {value[-1]}')
+                lines.append(f'{name}_count{labels} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+REQUEST_DURATION = Histogram(
+    registry, 'api_request_duration_seconds',
+    'Время обработки запроса', ('view', 'action')
+)
+SQL_DURATION = Histogram(
+    registry, 'api_sql_duration_seconds',
+    'Суммарное время SQL-запросов за запрос', ('view', 'action')
+)
+RESPONSES = Counter(
+    registry, 'api_responses_total',
+    'Количество ответов', ('view', 'action', 'status')
+)
+CACHE_REQUESTS = Counter(
+    registry, 'api_cache_requests_total',
+    'Обращения к кешу', ('cache', 'result')
+)
+SHORT_LINK_HITS = Counter(
+    registry, 'api_short_link_hits_total',
+    'Переходы по коротким ссылкам'
+)
+SHOPPING_CART_DOWNLOADS = Counter(
+    registry, 'api_shopping_cart_downloads_total',
+    'Выгрузки списка покупок', ('mode',)
+)
+DB_CONNECTIONS = Counter(
+    registry, 'api_db_connections_total',
+    'Открытые соединения с БД', ('alias',)
+)
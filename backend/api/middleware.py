@@ -0,0 +1,185 @@
+import random
+from contextlib import ExitStack
+from time import perf_counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from rest_framework.exceptions import APIException
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from . import metrics
+from .compression import (choose_encoding, compress, is_cacheable,
+                          is_compressible)
+from .db_router import RoutingState, pin_to_primary, routing_state
+from .profiling import Sampler, store_profile
+
+
+class SQLTimer:
+    __slots__ = ('duration',)
+
+    def __init__(self):
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += perf_counter() - started
+
+
+class MetricsMiddleware:
+    """Собирает метрики времени обработки и SQL по view и action DRF.
+
+    Время SQL суммируется по всем подключениям, включая реплики.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    @staticmethod
+    def get_labels(request):
+        match = request.resolver_match
+        if match is None:
+            return 'unresolved', request.method.lower()
+        view = getattr(match.func, 'cls', match.func).__name__
+        actions = getattr(match.func, 'actions', None) or {}
+        method = request.method.lower()
+        return view, actions.get(method, method)
+
+    def __call__(self, request):
+        started = perf_counter()
+        timer = SQLTimer()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(timer))
+            response = self.get_response(request)
+        labels = self.get_labels(request)
+        metrics.REQUEST_DURATION.observe(perf_counter() - started, *labels)
+        metrics.SQL_DURATION.observe(timer.duration, *labels)
+        metrics.RESPONSES.inc(*labels, str(response.status_code))
+        return response
+
+
+class ReplicaMiddleware:
+    """Задаёт маршрутизацию чтений на реплики для текущего запроса и
+    закрепляет клиента за основной БД после успешного небезопасного
+    запроса или любого запроса, записавшего в БД."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        safe = request.method in SAFE_METHODS
+        state = RoutingState(request, primary=not safe)
+        token = routing_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            routing_state.reset(token)
+        if (settings.DATABASE_REPLICAS and response.status_code < 400
+                and (not safe or state.wrote)):
+            pin_to_primary(response)
+        return response
+
+
+class CompressionMiddleware:
+    """Сжимает ответы gzip, brotli или zstd по заголовку Accept-Encoding.
+
+    Сжимаются только текстовые ответы не короче COMPRESSION_MIN_SIZE
+    байт. Если view задал response.compressed_cache_key (закешированные
+    страницы), сжатое тело хранится в кеше под этим ключом для каждой
+    кодировки и повторно не сжимается. В кеш попадают только ответы
+    JSON без cookie и Vary: Cookie, поэтому middleware стоит выше
+    ReplicaMiddleware и видит её cookie закрепления.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not is_compressible(response):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING'))
+        if encoding is None:
+            return response
+        cache_key = None
+        if is_cacheable(response):
+            cache_key = getattr(response, 'compressed_cache_key', None)
+        content = None
+        if cache_key:
+            cache_key = f'{cache_key}:{response["Content-Type"]}:{encoding}'
+            content = cache.get(cache_key)
+        if content is None:
+            content = compress(response.content, encoding)
+            if cache_key:
+                cache.set(
+                    cache_key, content, settings.RESPONSE_CACHE_TIMEOUT
+                )
+        if len(content) >= len(response.content):
+            return response
+        response.content = content
+        response['Content-Length'] = str(len(content))
+        response['Content-Encoding'] = encoding
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
+
+
+class ProfilerMiddleware:
+    """Статистическое профилирование запросов.
+
+    Профилируются запросы сотрудников с параметром ?_profile= и доля
+    PROFILER_SAMPLE_RATE всех запросов. Профиль сохраняется в кольцевой
+    буфер последних профилей, его id возвращается в заголовке
+    X-Profile-Id. При ?_profile=collapsed вместо ответа возвращаются
+    стеки в формате collapsed для построения flamegraph.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    @staticmethod
+    def is_staff(request):
+        """Аутентифицирует запрос так же, как DRF, чтобы проверить
+        права до вызова view."""
+        authenticators = [
+            authenticator()
+            for authenticator in api_settings.DEFAULT_AUTHENTICATION_CLASSES
+        ]
+        try:
+            user = Request(request, authenticators=authenticators).user
+        except APIException:
+            return False
+        return user.is_staff
+
+    def __call__(self, request):
+        mode = request.GET.get('_profile')
+        if mode is not None and not self.is_staff(request):
+            mode = None
+        if mode is None and not (
+            settings.PROFILER_SAMPLE_RATE
+            and random.random() < settings.PROFILER_SAMPLE_RATE
+        ):
+            return self.get_response(request)
+        sampler = Sampler()
+        sampler.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            sampler.stop()
+        profile_id = store_profile(sampler, request, response.status_code)
+        if mode == 'collapsed':
+            response = HttpResponse(
+                sampler.collapsed(), content_type='text/plain; charset=utf-8'
+            )
+        response['X-Profile-Id'] = profile_id
+        return response
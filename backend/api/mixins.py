@@ -0,0 +1,182 @@
+import hashlib
+from calendar import timegm
+from datetime import datetime
+
+from django.db.models import Count, Max
+from django.http import Http404
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from rest_framework.exceptions import ValidationError
+from rest_framework.mixins import ListModelMixin
+from rest_framework.response import Response
+
+
+class ValuesListModelMixin(ListModelMixin):
+    """Выдача списка через QuerySet.values() и лёгкий сериализатор.
+
+    Для действия list запрашиваются только нужные столбцы, экземпляры
+    моделей не создаются. Остальные действия, вызывающие list()
+    (например, subscriptions), обрабатываются как обычно.
+    Параметры запроса ?fields= и ?expand= (через запятую) ограничивают
+    выводимые поля и разворачиваемые вложенные объекты. Без обоих
+    параметров выводится полный ответ; если передан хотя бы один,
+    не указанные в expand вложенные объекты заменяются на id.
+    - get_values_queryset() - строит запрос .values() для страницы;
+    - prepare_rows() - дополняет строки страницы вложенными данными;
+    - retrieve_values() - выдаёт один объект тем же способом.
+    """
+    values_serializer_class = None
+
+    def get_query_list(self, name):
+        value = self.request.query_params.get(name)
+        if value is None:
+            return None
+        return [item.strip() for item in value.split(',') if item.strip()]
+
+    def get_sparse_params(self):
+        """Возвращает (fields, expand) для сериализатора или (None, None),
+        если выборочный вывод не запрошен."""
+        fields = self.get_query_list('fields')
+        expand = self.get_query_list('expand')
+        if fields is None and expand is None:
+            return None, None
+        serializer_class = self.values_serializer_class
+        errors = {}
+        unknown = set(fields or ()) - set(serializer_class.fields)
+        if unknown:
+            errors['fields'] = [
+                f'Неизвестные поля: {", ".join(sorted(unknown))}'
+            ]
+        unknown = set(expand or ()) - set(serializer_class.expandable)
+        if unknown:
+            errors['expand'] = [
+                f'Нельзя развернуть: {", ".join(sorted(unknown))}'
+            ]
+        if errors:
+            raise ValidationError(errors)
+        return fields or None, expand or ()
+
+    def is_sparse(self):
+        return any(
+            name in self.request.query_params for name in ('fields', 'expand')
+        )
+
+    def get_values_serializer(self):
+        fields, expand = self.get_sparse_params()
+        return self.values_serializer_class(
+            context=self.get_serializer_context(),
+            fields=fields,
+            expand=expand
+        )
+
+    def get_values_queryset(self, queryset, serializer):
+        return queryset.values(*serializer.get_columns())
+
+    def prepare_rows(self, rows, serializer):
+        return rows
+
+    def list(self, request, *args, **kwargs):
+        if self.action != 'list':
+            return super().list(request, *args, **kwargs)
+        serializer = self.get_values_serializer()
+        queryset = self.get_values_queryset(
+            self.filter_queryset(self.get_queryset()), serializer
+        )
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(
+                serializer.to_representation_many(
+                    self.prepare_rows(page, serializer)
+                )
+            )
+        return Response(serializer.to_representation_many(
+            self.prepare_rows(queryset, serializer)
+        ))
+
+    def retrieve_values(self, **lookup):
+        """Выдаёт объект через .values(). По умолчанию объект ищется
+        по lookup_field; права на объект для безопасных методов
+        не проверяются."""
+        if not lookup:
+            lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+            lookup = {self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        serializer = self.get_values_serializer()
+        row = self.get_values_queryset(
+            self.get_queryset().filter(**lookup), serializer
+        ).first()
+        if row is None:
+            raise Http404
+        return Response(serializer.to_representation(
+            self.prepare_rows([row], serializer)[0]
+        ))
+
+
+class ConditionalGetMixin:
+    """Условные GET-запросы (ETag и Last-Modified).
+
+    Валидаторы строятся по полям modified_fields без сериализации:
+    для списка - максимальные даты изменения и число записей
+    отфильтрованного запроса, для объекта - его даты изменения. В ETag
+    входят также полный путь запроса и дата изменения текущего
+    пользователя, так как его избранное, покупки и подписки влияют на
+    ответ. Если у клиента актуальная версия, ответ 304 возвращается
+    до обращения к сериализаторам.
+    - get_list_validators(), get_object_validators() - значения,
+      от которых зависит ответ;
+    - get_etag() - ETag по валидаторам;
+    - conditional_response() - возвращает 304 или ответ get_response()
+      с заголовками ETag и Last-Modified.
+    """
+    modified_fields = ('updated_at',)
+
+    def get_list_validators(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        return tuple(queryset.aggregate(
+            count=Count('pk'),
+            **{
+                f'modified_{number}': Max(field)
+                for number, field in enumerate(self.modified_fields)
+            }
+        ).values())
+
+    def get_object_validators(self):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        return (
+            self.get_queryset()
+            .filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+            .values_list(*self.modified_fields)
+            .first()
+        )
+
+    def get_etag(self, validators):
+        user = self.request.user
+        if user.is_authenticated:
+            validators = (*validators, user.updated_at)
+        return '"{}"'.format(hashlib.md5(
+            repr((self.request.get_full_path(), validators)).encode()
+        ).hexdigest())
+
+    def conditional_response(self, validators, get_response,
+                             last_modified=True):
+        if validators is None:
+            return get_response()
+        etag = self.get_etag(validators)
+        timestamp = None
+        if last_modified:
+            dates = [
+                value for value in validators if isinstance(value, datetime)
+            ]
+            if dates:
+                timestamp = timegm(max(dates).utctimetuple())
+        not_modified = get_conditional_response(
+            self.request, etag=etag, last_modified=timestamp
+        )
+        if not_modified is not None:
+            return not_modified
+        response = get_response()
+        if response.status_code == 200:
+            response['ETag'] = etag
+            if timestamp is not None:
+                response['Last-Modified'] = http_date(timestamp)
+            patch_vary_headers(response, ('Authorization',))
+        return response
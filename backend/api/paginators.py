@@ -4,3 +4,11 @@ from rest_framework.pagination import PageNumberPagination
 class LimitPagination(PageNumberPagination):
     page_size = 6
     page_size_query_param = 'limit'
+
+    def get_page_size(self, request):
+        """При выборке по ?ids= без ?limit= все рецепты выдаются одной
+        страницей."""
+        ids = request.query_params.get('ids')
+        if ids and self.page_size_query_param not in request.query_params:
+            return max(len(ids.split(',')), self.page_size)
+        return super().get_page_size(request)
@@ -0,0 +1,105 @@
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+PROFILES_KEY = 'profiles'
+PROFILE_KEY = 'profile:{}'
+
+
+class Sampler:
+    """Статистический профилировщик одного потока.
+
+    Отдельный поток раз в PROFILER_INTERVAL секунд снимает стек
+    профилируемого потока через sys._current_frames() и считает
+    одинаковые стеки. Сам профилируемый код не замедляется
+    трассировкой, поэтому накладные расходы почти не зависят от числа
+    вызовов функций.
+    """
+
+    def __init__(self, thread_id=None, interval=None):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval or settings.PROFILER_INTERVAL
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(
+            target=self.run, name='profiler', daemon=True
+        )
+        self.root = self.started = self.duration = None
+
+    @staticmethod
+    def get_frame_label(frame):
+        """Имя кадра: функция, файл и строка её начала. Одноимённые
+        методы разных классов одного модуля различаются по строке."""
+        code = frame.f_code
+        return f'{code.co_name} ({code.co_filename}:{code.co_firstlineno})'
+
+    def get_stack(self, frame):
+        """Стек от кадра, вызвавшего start(), до текущего кадра."""
+        stack = []
+        while frame is not None:
+            stack.append(self.get_frame_label(frame))
+            if frame is self.root:
+                break
+            frame = frame.f_back
+        return ';'.join(reversed(stack))
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[self.get_stack(frame)] += 1
+
+    def start(self):
+        self.root = sys._getframe(1)
+        self.started = time.perf_counter()
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        self.duration = time.perf_counter() - self.started
+
+    def collapsed(self):
+        """Стеки в формате collapsed для flamegraph.pl и speedscope:
+        строка "кадр;кадр;... число_выборок" на каждый стек."""
+        return ''.join(
+            f'{stack} {count}\n' for stack, count in self.stacks.most_common()
+        )
+
+
+def store_profile(sampler, request, status_code):
+    """Сохраняет профиль в кеш и добавляет его в кольцевой буфер из
+    PROFILER_RING_SIZE последних профилей. Возвращает id профиля."""
+    profile_id = uuid.uuid4().hex
+    user = getattr(request, 'user', None)
+    profile = {
+        'id': profile_id,
+        'created': timezone.now(),
+        'method': request.method,
+        'path': request.get_full_path(),
+        'status': status_code,
+        'user': str(user) if user and user.is_authenticated else '',
+        'duration': round(sampler.duration * 1000, 1),
+        'samples': sum(sampler.stacks.values()),
+    }
+    timeout = settings.PROFILER_CACHE_TIMEOUT
+    cache.set(PROFILE_KEY.format(profile_id), sampler.collapsed(), timeout)
+    profiles = [profile, *cache.get(PROFILES_KEY, ())]
+    cache.set(
+        PROFILES_KEY, profiles[:settings.PROFILER_RING_SIZE], timeout
+    )
+    return profile_id
+
+
+def get_profiles():
+    return cache.get(PROFILES_KEY, [])
+
+
+def get_profile(profile_id):
+    return cache.get(PROFILE_KEY.format(profile_id))
@@ -1,11 +1,15 @@
 import base64
+from functools import partial
 
+from django.conf import settings
+from django.core.cache import cache
 from django.db import transaction
 from django.core.files.base import ContentFile
 from rest_framework import serializers
 
 from api import utils
 from recipes.models import Ingredient, Recipe, RecipeComposition, Tag, User
+from tasks.models import Task
 
 
 class Base64ImageField(serializers.ImageField):
@@ -22,6 +26,39 @@ class Base64ImageField(serializers.ImageField):
             return super().to_internal_value(data)
 
 
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Поле PrimaryKeyRelatedField, не обращающееся к БД при валидации.
+
+    Проверяет только тип полученного значения и возвращает его как
+    первичный ключ. Все ключи затем проверяются одним запросом
+    в get_objects().
+    """
+    default_error_messages = {
+        'does_not_exist_many': (
+            'Недопустимые первичные ключи {pk_values} - '
+            'объекты не существуют.'
+        ),
+    }
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+    def get_objects(self, pks):
+        objects = self.get_queryset().in_bulk(pks)
+        missing = [pk for pk in pks if pk not in objects]
+        if missing:
+            self.fail(
+                'does_not_exist_many',
+                pk_values=', '.join(map(str, missing))
+            )
+        return [objects[pk] for pk in pks]
+
+
 class GetUserSerializer(serializers.ModelSerializer):
     """Сериализатор для просмотра пользователей."""
     is_subscribed = serializers.SerializerMethodField()
@@ -32,6 +69,8 @@ class GetUserSerializer(serializers.ModelSerializer):
                   'last_name', 'is_subscribed', 'avatar')
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'subscribed'):
+            return obj.subscribed
         user = self.context['request'].user
         if not user.is_authenticated:
             return False
@@ -90,7 +129,7 @@ class IngredientSerializer(serializers.ModelSerializer):
 class IngredientInputSerializer(serializers.ModelSerializer):
     """Сериализатор для обработки полученого списка ингредиентов
     рецепта при его создании."""
-    id = serializers.PrimaryKeyRelatedField(
+    id = BulkPrimaryKeyRelatedField(
         queryset=Ingredient.objects.all(), source='ingredient', required=True
     )
     amount = serializers.IntegerField(min_value=1, required=True)
@@ -111,7 +150,7 @@ class RecipeSerializer(serializers.ModelSerializer):
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
     author = GetUserSerializer(read_only=True)
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = BulkPrimaryKeyRelatedField(
         queryset=Tag.objects.all(),
         many=True,
         allow_null=False,
@@ -128,15 +167,16 @@ class RecipeSerializer(serializers.ModelSerializer):
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients', 'is_favorited',
                   'is_in_shopping_cart', 'name', 'image', 'text',
-                  'cooking_time')
-        read_only_fields = ('is_favorited', 'is_in_shopping_cart')
+                  'cooking_time', 'summary')
+        read_only_fields = ('is_favorited', 'is_in_shopping_cart',
+                            'summary')
 
     def validate_tags(self, value):
         if not value:
             raise serializers.ValidationError('Укажите теги')
         if len(value) != len(set(value)):
             raise serializers.ValidationError('Теги не должны повторяться')
-        return value
+        return self.fields['tags'].child_relation.get_objects(value)
 
     def validate_image(self, value):
         if not value:
@@ -144,14 +184,30 @@ class RecipeSerializer(serializers.ModelSerializer):
         return value
 
     def validate_ingredients(self, value):
-        ingredient_ids = map(lambda x: x['ingredient'].id, value)
+        ingredient_ids = [ingredient['ingredient'] for ingredient in value]
         if len(value) != len(set(ingredient_ids)):
             raise serializers.ValidationError(
                 'Ингредиенты не должны повторяться'
             )
+        ingredients = (
+            self.fields['ingredients'].child.fields['id']
+            .get_objects(ingredient_ids)
+        )
+        for item, ingredient in zip(value, ingredients):
+            item['ingredient'] = ingredient
         return value
 
+    def is_partial_mode(self):
+        """PATCH-запрос с параметром partial=1 не требует передачи
+        тегов и ингредиентов и оставляет их без изменений."""
+        return (
+            self.partial
+            and self.context['request'].GET.get('partial') == '1'
+        )
+
     def validate(self, attrs):
+        if self.is_partial_mode():
+            return super().validate(attrs)
         if 'composition' not in attrs:
             raise serializers.ValidationError(
                 {'ingredients': 'Укажите ингредиенты'}
@@ -187,22 +243,36 @@ class RecipeSerializer(serializers.ModelSerializer):
         ingredients = validated_data.pop('composition')
         recipe = Recipe.objects.create(
             author=self.context['request'].user,
+            summary=utils.get_summary(ingredients),
             **validated_data
         )
         recipe.short_link = base64.b64encode(str(recipe.id).encode()).decode()
         recipe.save()
+        # Ссылку могли запросить до создания рецепта и закешировать
+        # как несуществующую.
+        transaction.on_commit(partial(
+            cache.delete, utils.SHORT_LINK_CACHE_KEY.format(recipe.short_link)
+        ))
         recipe.tags.add(*tags)
         utils.save_ingredients(recipe, ingredients)
+        transaction.on_commit(utils.bump_recipes_version)
         return recipe
 
     @transaction.atomic
     def update(self, instance, validated_data):
-        tags = validated_data.pop('tags')
-        ingredients = validated_data.pop('composition')
+        tags = validated_data.pop('tags', None)
+        ingredients = validated_data.pop('composition', None)
+        if ingredients is not None:
+            validated_data['summary'] = utils.get_summary(ingredients)
         recipe = super().update(instance, validated_data)
-        recipe.tags.set(tags)
-        recipe.composition.all().delete()
-        utils.save_ingredients(recipe, ingredients)
+        if tags is not None:
+            utils.update_tags(recipe, tags)
+        if ingredients is not None:
+            utils.update_ingredients(recipe, ingredients)
+            transaction.on_commit(
+                lambda: utils.invalidate_recipe_shopping_lists([recipe.id])
+            )
+        transaction.on_commit(utils.bump_recipes_version)
         return recipe
 
 
@@ -232,57 +302,43 @@ class FavoriteRecipeSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'image', 'cooking_time')
         read_only_fields = ('id', 'name', 'image', 'cooking_time')
 
-    def get_obj_list(self, action):
-        if action == 'favorite':
-            return User.objects.filter(
-                favorites=self.instance,
-                id=self.context['request'].user.id
-            )
-        elif action == 'shopping_cart':
-            return User.objects.filter(
-                shopping_cart=self.instance,
-                id=self.context['request'].user.id
-            )
 
-    def validate(self, attrs):
-        VIEW_ACTION_NAME = {
-            'favorite': 'избранном',
-            'shopping_cart': 'списке покупок'
-        }
-        obj_list = utils.get_obj_list(
-            self.instance,
-            self.context['request'],
-            self.context['view'].action
-        )
-        if (self.context['request'].method == 'DELETE'
-                and not obj_list):
-            raise serializers.ValidationError(
-                "Данный рецепт не находится в "
-                f"{VIEW_ACTION_NAME[self.context['view'].action]}"
-            )
-        elif (self.context['request'].method == 'POST'
-                and obj_list):
-            raise serializers.ValidationError(
-                "Данный рецепт уже находится в "
-                f"{VIEW_ACTION_NAME[self.context['view'].action]}"
-            )
-        return super().validate(attrs)
+class RecipeBatchSerializer(serializers.Serializer):
+    """Сериализатор для пакетного добавления и удаления рецептов
+    в списке избранного и списке покупок."""
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False
+    )
 
 
 class DownloadShoppingCartSerializer(serializers.Serializer):
     """Возращает в виде объекта данные ингредиента и его количество."""
     name = serializers.CharField()
     measurement_unit = serializers.CharField()
-    amount = serializers.IntegerField()
+    amount = serializers.CharField()
+
+
+class ServingsSerializer(serializers.Serializer):
+    """Количество порций рецепта в списке покупок."""
+    servings = serializers.IntegerField(
+        min_value=1, max_value=1000, default=1
+    )
+
+
+class RecipeChangesSerializer(serializers.Serializer):
+    """Параметры ленты изменений рецептов."""
+    since = serializers.IntegerField(min_value=0, required=False)
+    limit = serializers.IntegerField(
+        min_value=1, max_value=settings.RECIPE_CHANGES_LIMIT,
+        default=settings.RECIPE_CHANGES_LIMIT
+    )
 
 
 class SubscriptionSerializer(GetUserSerializer):
     """Сериализатор, изспользуемый для отображения списке подписок."""
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.IntegerField(
-        source='recipes.count',
-        read_only=True
-    )
+    recipes_count = serializers.IntegerField(read_only=True)
 
     class Meta(GetUserSerializer.Meta):
         fields = ('email', 'id', 'username', 'first_name',
@@ -292,43 +348,32 @@ class SubscriptionSerializer(GetUserSerializer):
                             'last_name', 'avatar', 'is_subscribed')
 
     def get_recipes(self, obj):
-        recipes_limit = self.context['request'].GET.get('recipes_limit')
+        request = self.context['request']
+        recipes_limit = request.GET.get('recipes_limit')
+        if recipes_limit is None and request.method == 'POST':
+            recipes_limit = settings.SUBSCRIPTION_RECIPES_LIMIT
+        recipes = obj.recipes.all()
         if recipes_limit:
             try:
-                recipes_limit = int(recipes_limit)
-                return FavoriteRecipeSerializer(
-                    obj.recipes.all()[:recipes_limit],
-                    many=True
-                ).data
+                recipes = recipes[:int(recipes_limit)]
             except ValueError:
                 pass
-        return FavoriteRecipeSerializer(obj.recipes.all(), many=True).data
+        return FavoriteRecipeSerializer(recipes, many=True).data
 
-    def validate(self, attrs):
-        subscriber_list = User.objects.filter(
-            subscribers=self.context['request'].user,
-            id=self.instance.id
-        )
-        if self.instance == self.context['request'].user:
-            raise serializers.ValidationError(
-                'Нельзя подписаться на самого себя'
-            )
-        elif (self.context['request'].method == 'DELETE'
-                and not subscriber_list):
-            raise serializers.ValidationError(
-                'Вы не подписаны на данного пользователя'
-            )
-        elif (self.context['request'].method == 'POST'
-              and subscriber_list):
-            raise serializers.ValidationError(
-                'Вы уже подписаны на данного пользователя'
-            )
-        return super().validate(attrs)
 
-    @transaction.atomic
-    def update(self, instance, validated_data):
-        if self.context['request'].method == 'POST':
-            instance.subscribers.add(self.context['request'].user)
-        elif self.context['request'].method == 'DELETE':
-            instance.subscribers.remove(self.context['request'].user)
-        return instance
+class UserBatchSerializer(serializers.Serializer):
+    """Сериализатор для пакетной подписки и отписки от пользователей."""
+    users = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False
+    )
+
+
+class TaskSerializer(serializers.ModelSerializer):
+    """Сериализатор для просмотра статуса фоновых задач."""
+
+    class Meta:
+        model = Task
+        fields = ('id', 'name', 'status', 'attempts', 'progress', 'created',
+                  'started', 'finished')
+        read_only_fields = fields
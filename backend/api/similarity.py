@@ -0,0 +1,171 @@
+import logging
+import math
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connections
+
+from recipes.models import Recipe, RecipeComposition
+
+INGREDIENT_WEIGHT = 1.0
+TAG_WEIGHT = 0.5
+# Признаки, встречающиеся в большем числе рецептов (популярные теги,
+# соль), не учитываются: они почти не влияют на близость, а их списки
+# рецептов определяют время поиска соседей.
+MAX_POSTINGS = 2000
+
+logger = logging.getLogger(__name__)
+
+
+class Snapshot:
+    """Построенный индекс. После создания не изменяется, кроме кеша
+    найденных соседей, поэтому читается без блокировок."""
+    __slots__ = ('vectors', 'norms', 'postings', 'neighbours', 'built_at')
+
+    def __init__(self, vectors=None, norms=None, postings=None,
+                 built_at=None):
+        self.vectors = vectors or {}
+        self.norms = norms or {}
+        self.postings = postings or {}
+        self.neighbours = {}
+        self.built_at = built_at
+
+
+class SimilarityIndex:
+    """Индекс похожих рецептов.
+
+    Каждый рецепт представлен разреженным вектором признаков
+    (ингредиенты и теги), хранящимся в памяти процесса. Вес признака
+    умножается на его IDF, поэтому признаки, общие для многих рецептов,
+    весят меньше, а признаки из больше чем MAX_POSTINGS рецептов
+    отбрасываются. Рецепты, помеченные на удаление, в индекс не входят.
+
+    Индекс строится двумя запросами к БД в фоновом потоке, который
+    запускается при обращении к устаревшему индексу, но не чаще раза
+    в SIMILAR_RECIPES_REBUILD_INTERVAL секунд; запросы тем временем
+    получают соседей из предыдущей версии, а до первой перестройки -
+    пустой список. Косинусная близость считается через
+    инвертированный индекс, поэтому обрабатываются только рецепты,
+    имеющие хотя бы один общий признак. Найденные соседи кешируются
+    для каждого рецепта до следующей перестройки.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._building = False
+        self._snapshot = Snapshot()
+
+    def is_stale(self):
+        built_at = self._snapshot.built_at
+        return (
+            built_at is None
+            or time.monotonic() - built_at
+            > settings.SIMILAR_RECIPES_REBUILD_INTERVAL
+        )
+
+    def get_vectors(self):
+        vectors = defaultdict(dict)
+        compositions = RecipeComposition.objects.filter(
+            recipe__deleted_at__isnull=True
+        ).values_list('recipe_id', 'ingredient_id')
+        for recipe_id, ingredient_id in compositions.iterator():
+            vectors[recipe_id][('ingredient', ingredient_id)] = (
+                INGREDIENT_WEIGHT
+            )
+        recipe_tags = Recipe.tags.through.objects.filter(
+            recipe__deleted_at__isnull=True
+        ).values_list('recipe_id', 'tag_id')
+        for recipe_id, tag_id in recipe_tags.iterator():
+            vectors[recipe_id][('tag', tag_id)] = TAG_WEIGHT
+        return vectors
+
+    def build(self):
+        vectors = self.get_vectors()
+        frequencies = defaultdict(int)
+        for vector in vectors.values():
+            for feature in vector:
+                frequencies[feature] += 1
+        postings = defaultdict(list)
+        norms = {}
+        for recipe_id, vector in vectors.items():
+            for feature in list(vector):
+                frequency = frequencies[feature]
+                if frequency > MAX_POSTINGS:
+                    del vector[feature]
+                    continue
+                vector[feature] *= math.log(1 + len(vectors) / frequency)
+                postings[feature].append((recipe_id, vector[feature]))
+            norms[recipe_id] = math.sqrt(
+                sum(weight ** 2 for weight in vector.values())
+            )
+        self._snapshot = Snapshot(
+            dict(vectors), norms, dict(postings), time.monotonic()
+        )
+
+    def rebuild(self):
+        try:
+            self.build()
+        except Exception:
+            logger.exception('Не удалось перестроить индекс похожих рецептов')
+        finally:
+            connections.close_all()
+            with self._lock:
+                self._building = False
+
+    def refresh(self):
+        """Запускает перестройку в фоновом потоке, если индекс устарел
+        и не перестраивается."""
+        if not self.is_stale():
+            return
+        with self._lock:
+            if self._building:
+                return
+            self._building = True
+        threading.Thread(
+            target=self.rebuild, name='similarity-index', daemon=True
+        ).start()
+
+    @staticmethod
+    def compute(snapshot, recipe_id):
+        vector = snapshot.vectors[recipe_id]
+        norm = snapshot.norms[recipe_id]
+        if not norm:
+            return []
+        scores = defaultdict(float)
+        for feature, weight in vector.items():
+            for other_id, other_weight in snapshot.postings[feature]:
+                if other_id != recipe_id:
+                    scores[other_id] += weight * other_weight
+        ranked = sorted(
+            scores.items(),
+            key=lambda item: (
+                -item[1] / (norm * snapshot.norms[item[0]]), -item[0]
+            )
+        )
+        return [
+            other_id for other_id, _ in
+            ranked[:settings.SIMILAR_RECIPES_LIMIT]
+        ]
+
+    def neighbours(self, recipe_id):
+        """Возвращает id похожих рецептов по убыванию близости.
+
+        Если рецепта нет в индексе (например, он создан после
+        последней перестройки или индекс ещё не построен), возвращает
+        None.
+        """
+        self.refresh()
+        snapshot = self._snapshot
+        if recipe_id not in snapshot.vectors:
+            return None
+        neighbours = snapshot.neighbours.get(recipe_id)
+        if neighbours is None:
+            neighbours = snapshot.neighbours[recipe_id] = self.compute(
+                snapshot, recipe_id
+            )
+        return neighbours
+
+
+similarity_index = SimilarityIndex()
@@ -0,0 +1,16 @@
+from api import utils
+from recipes.models import User
+from tasks.registry import task
+
+
+@task(name='export_shopping_cart')
+def export_shopping_cart(user_id):
+    """Формирует текстовый файл списка покупок пользователя."""
+    user = User.objects.get(pk=user_id)
+    return {
+        'filename': 'shopping_cart.txt',
+        'content_type': 'text/plain',
+        'content': utils.format_shopping_list(
+            utils.get_shopping_list(user)
+        ),
+    }
@@ -0,0 +1,54 @@
+import base64
+import io
+
+import pytest
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, Tag
+
+
+def make_image():
+    buffer = io.BytesIO()
+    Image.new('RGB', (2, 2), 'red').save(buffer, 'PNG')
+    return (
+        'data:image/png;base64,'
+        + base64.b64encode(buffer.getvalue()).decode()
+    )
+
+
+@pytest.fixture
+def user_client(user):
+    client = APIClient()
+    client.credentials(
+        HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user).key}'
+    )
+    return client
+
+
+@pytest.fixture
+def tag(db):
+    return Tag.objects.create(name='Завтрак', slug='breakfast')
+
+
+@pytest.fixture
+def ingredient(db):
+    return Ingredient.objects.create(name='Мука', measurement_unit='г')
+
+
+@pytest.fixture
+def create_recipe(user_client, tag, ingredient):
+    def create_recipe(name='Блины', text='Текст рецепта', **data):
+        response = user_client.post('/api/recipes/', {
+            'name': name,
+            'text': text,
+            'cooking_time': 10,
+            'image': make_image(),
+            'tags': [tag.id],
+            'ingredients': [{'id': ingredient.id, 'amount': 200}],
+            **data
+        }, format='json')
+        assert response.status_code == 201, response.data
+        return response.data
+    return create_recipe
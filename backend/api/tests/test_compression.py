@@ -0,0 +1,54 @@
+import gzip
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.utils.cache import patch_vary_headers
+
+from api.middleware import CompressionMiddleware
+
+CACHE_KEY = 'response:test'
+BODY = b'{"results": [' + b'"value", ' * 200 + b'"value"]}'
+
+
+def run(response):
+    request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip')
+    response.compressed_cache_key = CACHE_KEY
+    return CompressionMiddleware(lambda request: response)(request)
+
+
+def json_response():
+    return HttpResponse(BODY, content_type='application/json')
+
+
+def cached_body(response):
+    return cache.get(f'{CACHE_KEY}:{response["Content-Type"]}:gzip')
+
+
+def test_json_response_is_cached():
+    response = run(json_response())
+    assert response['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(response.content) == BODY
+    assert cached_body(response) == response.content
+
+
+def test_response_with_cookie_is_not_cached():
+    response = json_response()
+    response.set_cookie('primary_pin', 'signed')
+    response = run(response)
+    assert response['Content-Encoding'] == 'gzip'
+    assert cached_body(response) is None
+
+
+def test_response_varying_on_cookie_is_not_cached():
+    response = json_response()
+    patch_vary_headers(response, ('Cookie',))
+    response = run(response)
+    assert response['Content-Encoding'] == 'gzip'
+    assert cached_body(response) is None
+
+
+def test_non_json_response_is_not_cached():
+    response = run(HttpResponse(BODY, content_type='text/html'))
+    assert response['Content-Encoding'] == 'gzip'
+    assert cached_body(response) is None
@@ -0,0 +1,105 @@
+import pytest
+
+from api.utils import bump_recipes_version
+
+LIST_URL = '/api/recipes/'
+
+
+@pytest.fixture
+def recipe(create_recipe):
+    return create_recipe()
+
+
+def get(client, url, etag=None):
+    headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+    return client.get(url, **headers)
+
+
+def assert_etag_changes(client, url, change):
+    etag = get(client, url)['ETag']
+    assert get(client, url, etag).status_code == 304
+    change()
+    response = get(client, url, etag)
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_ingredient_rename_changes_recipe_etag(recipe, user_client,
+                                               ingredient):
+    def rename():
+        ingredient.name = 'Мука пшеничная'
+        ingredient.save()
+
+    data = assert_etag_changes(
+        user_client, f'{LIST_URL}{recipe["id"]}/', rename
+    )
+    assert data['ingredients'][0]['name'] == 'Мука пшеничная'
+
+
+@pytest.mark.parametrize('url', ('{LIST_URL}{id}/', '{LIST_URL}'))
+def test_tag_rename_changes_recipe_etag(url, recipe, user_client, tag):
+    def rename():
+        tag.name = 'Обед'
+        tag.save()
+
+    data = assert_etag_changes(
+        user_client, url.format(LIST_URL=LIST_URL, id=recipe['id']), rename
+    )
+    if 'results' in data:
+        data = data['results'][0]
+    assert data['tags'][0]['name'] == 'Обед'
+
+
+def test_tag_delete_changes_recipe_etag(recipe, user_client, tag):
+    data = assert_etag_changes(
+        user_client, f'{LIST_URL}{recipe["id"]}/', tag.delete
+    )
+    assert data['tags'] == []
+
+
+@pytest.mark.parametrize('url', (
+    '/api/users/?fields=id,recipes_count',
+    '/api/users/{id}/?fields=id,recipes_count',
+    '/api/users/me/?fields=id,recipes_count',
+))
+def test_new_recipe_changes_recipes_count_etag(url, create_recipe,
+                                               user_client, user):
+    url = url.format(id=user.id)
+    data = assert_etag_changes(user_client, url, create_recipe)
+    if 'results' in data:
+        data = data['results'][0]
+    assert data['recipes_count'] == 1
+
+
+def test_deleted_recipe_changes_recipes_count_etag(recipe, user_client):
+    url = '/api/users/?fields=id,recipes_count'
+
+    def delete():
+        response = user_client.delete(f'{LIST_URL}{recipe["id"]}/')
+        assert response.status_code == 204
+
+    data = assert_etag_changes(user_client, url, delete)
+    assert data['results'][0]['recipes_count'] == 0
+
+
+@pytest.mark.django_db
+def test_anonymous_list_cache_hit_skips_validators(
+        recipe, client, django_assert_num_queries):
+    etag = get(client, LIST_URL)['ETag']
+    with django_assert_num_queries(0):
+        response = get(client, LIST_URL)
+    assert response.status_code == 200
+    assert response['ETag'] == etag
+    with django_assert_num_queries(0):
+        assert get(client, LIST_URL, etag).status_code == 304
+
+
+def test_anonymous_list_etag_changes_with_recipes(recipe, client, tag):
+    def rename():
+        tag.name = 'Обед'
+        tag.save()
+        # В тестах без transaction=True on_commit не вызывается.
+        bump_recipes_version()
+
+    data = assert_etag_changes(client, LIST_URL, rename)
+    assert data['results'][0]['tags'][0]['name'] == 'Обед'
@@ -0,0 +1,172 @@
+import pytest
+from django.core import signing
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections, router
+from django.http import HttpResponse
+from django.test import RequestFactory
+from rest_framework.authtoken.models import Token
+
+from api import metrics
+from api.db_router import (PIN_COOKIE, ReplicaRouter, RoutingState,
+                           pin_to_primary, routing_state)
+from api.middleware import MetricsMiddleware, ReplicaMiddleware
+from recipes.models import Tag, User
+
+REPLICA = 'replica_1'
+
+pytestmark = pytest.mark.django_db(databases=[DEFAULT_DB_ALIAS, REPLICA])
+
+
+@pytest.fixture
+def replica_router(settings, monkeypatch):
+    settings.DATABASE_REPLICAS = [REPLICA]
+    settings.REPLICA_STICKINESS_TIMEOUT = 5
+    replica_router = ReplicaRouter()
+    monkeypatch.setattr(router, 'routers', [replica_router])
+    return replica_router
+
+
+@pytest.fixture
+def factory():
+    return RequestFactory()
+
+
+def route(request, primary=False):
+    token = routing_state.set(RoutingState(request, primary))
+    try:
+        return router.db_for_read(Tag)
+    finally:
+        routing_state.reset(token)
+
+
+def pinned_request(factory):
+    response = HttpResponse()
+    pin_to_primary(response)
+    request = factory.get('/api/tags/')
+    request.COOKIES[PIN_COOKIE] = response.cookies[PIN_COOKIE].value
+    return request
+
+
+def test_reads_outside_request_use_primary(replica_router):
+    assert router.db_for_read(Tag) == DEFAULT_DB_ALIAS
+
+
+def test_safe_request_reads_from_replica(replica_router, factory):
+    assert route(factory.get('/api/tags/')) == REPLICA
+
+
+def test_unsafe_request_reads_from_primary(replica_router, factory):
+    assert route(factory.post('/api/tags/'), primary=True) == DEFAULT_DB_ALIAS
+
+
+def test_writes_always_use_primary(replica_router, factory):
+    assert router.db_for_write(Tag) == DEFAULT_DB_ALIAS
+
+
+def test_read_after_write_uses_primary(replica_router, factory):
+    token = routing_state.set(RoutingState(factory.get('/'), False))
+    try:
+        assert router.db_for_read(Tag) == REPLICA
+        assert router.db_for_write(Tag) == DEFAULT_DB_ALIAS
+        assert router.db_for_read(Tag) == DEFAULT_DB_ALIAS
+        assert routing_state.get().wrote
+    finally:
+        routing_state.reset(token)
+
+
+def test_unavailable_replica_falls_back_to_primary(replica_router, factory,
+                                                   monkeypatch):
+    def fail():
+        raise DatabaseError
+
+    monkeypatch.setattr(connections[REPLICA], 'ensure_connection', fail)
+    assert route(factory.get('/api/tags/')) == DEFAULT_DB_ALIAS
+    assert not replica_router.is_healthy(REPLICA)
+
+
+def test_pinned_client_reads_from_primary(replica_router, factory):
+    assert route(pinned_request(factory)) == DEFAULT_DB_ALIAS
+
+
+def test_pin_expires(replica_router, factory, monkeypatch):
+    request = pinned_request(factory)
+    now = signing.time.time()
+    monkeypatch.setattr(signing.time, 'time', lambda: now + 6)
+    assert route(request) == REPLICA
+
+
+def test_forged_pin_is_ignored(replica_router, factory):
+    request = factory.get('/api/tags/')
+    request.COOKIES[PIN_COOKIE] = '1'
+    assert route(request) == REPLICA
+
+
+def middleware_response(factory, method, view):
+    middleware = ReplicaMiddleware(lambda request: view())
+    return middleware(getattr(factory, method)('/'))
+
+
+def test_unsafe_request_pins_client(replica_router, factory):
+    response = middleware_response(factory, 'post', HttpResponse)
+    assert PIN_COOKIE in response.cookies
+
+
+def test_failed_request_does_not_pin(replica_router, factory):
+    response = middleware_response(
+        factory, 'post', lambda: HttpResponse(status=400)
+    )
+    assert PIN_COOKIE not in response.cookies
+
+
+def test_read_only_request_does_not_pin(replica_router, factory):
+    response = middleware_response(factory, 'get', HttpResponse)
+    assert PIN_COOKIE not in response.cookies
+
+
+@pytest.mark.django_db(
+    databases=[DEFAULT_DB_ALIAS, REPLICA], transaction=True
+)
+def test_safe_request_with_write_pins_client(replica_router, factory):
+    def view():
+        Tag.objects.create(name='Тег', slug='tag')
+        return HttpResponse()
+
+    response = middleware_response(factory, 'get', view)
+    assert PIN_COOKIE in response.cookies
+
+
+@pytest.mark.django_db(
+    databases=[DEFAULT_DB_ALIAS, REPLICA], transaction=True
+)
+def test_async_shopping_cart_export_pins_client(replica_router, client):
+    user = User.objects.create_user(
+        username='user', email='user@example.com', password='password',
+        first_name='Имя', last_name='Фамилия'
+    )
+    token = Token.objects.create(user=user)
+    response = client.get(
+        '/api/recipes/download_shopping_cart/?async=1',
+        HTTP_AUTHORIZATION=f'Token {token.key}'
+    )
+    assert response.status_code == 202
+    assert PIN_COOKIE in response.cookies
+
+
+def test_metrics_time_queries_on_all_connections(factory, monkeypatch):
+    ticks = iter(range(100))
+    observed = []
+    monkeypatch.setattr('api.middleware.perf_counter', lambda: next(ticks))
+    monkeypatch.setattr(
+        metrics.SQL_DURATION, 'observe',
+        lambda value, *labels: observed.append(value)
+    )
+
+    def view(request):
+        for alias in (DEFAULT_DB_ALIAS, REPLICA):
+            with connections[alias].cursor() as cursor:
+                cursor.execute('SELECT 1')
+        return HttpResponse()
+
+    request = factory.get('/')
+    request.resolver_match = None
+    MetricsMiddleware(view)(request)
+    assert observed == [2]
@@ -0,0 +1,75 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from api.metrics import AGGREGATE_FILENAME, Counter, Registry
+
+EXTERNAL_ADDRESS = '203.0.113.7'
+
+
+@pytest.fixture
+def registry(settings, tmp_path):
+    settings.METRICS_DIR = str(tmp_path)
+    registry = Registry()
+    Counter(registry, 'hits_total', 'Обращения')
+    return registry
+
+
+@pytest.fixture
+def dead_pid():
+    process = subprocess.Popen((sys.executable, '-c', ''))
+    process.wait()
+    return process.pid
+
+
+def write_metrics(path, value):
+    path.write_text(json.dumps([['hits_total', [], value]]))
+
+
+@pytest.mark.django_db
+def test_metrics_allowed_for_local_address(client):
+    assert client.get('/metrics').status_code == 200
+
+
+@pytest.mark.django_db
+def test_metrics_forbidden_for_other_addresses(client):
+    response = client.get(
+        '/metrics', REMOTE_ADDR=EXTERNAL_ADDRESS,
+        HTTP_X_FORWARDED_FOR='127.0.0.1'
+    )
+    assert response.status_code == 403
+
+
+def test_metrics_allowed_for_staff(client, user):
+    user.is_staff = True
+    user.save()
+    client.force_login(user)
+    response = client.get('/metrics', REMOTE_ADDR=EXTERNAL_ADDRESS)
+    assert response.status_code == 200
+
+
+def test_dead_process_values_are_kept(registry, tmp_path, dead_pid):
+    write_metrics(tmp_path / f'metrics_{dead_pid}.json', 5)
+    registry.update('hits_total', (), 1)
+    assert registry.collect() == {('hits_total', ()): 6}
+    assert not (tmp_path / f'metrics_{dead_pid}.json').exists()
+    assert registry.collect() == {('hits_total', ()): 6}
+
+
+def test_retire_moves_values_to_aggregate(registry, tmp_path):
+    write_metrics(tmp_path / AGGREGATE_FILENAME, 5)
+    registry.update('hits_total', (), 2)
+    registry.retire()
+    assert [path.name for path in tmp_path.glob('*.json')] == [
+        AGGREGATE_FILENAME
+    ]
+    assert registry.collect() == {('hits_total', ()): 7}
+
+
+def test_reused_pid_file_is_not_overwritten(registry, tmp_path):
+    write_metrics(tmp_path / f'metrics_{os.getpid()}.json', 5)
+    registry.update('hits_total', (), 1)
+    assert registry.collect() == {('hits_total', ()): 6}
@@ -0,0 +1,31 @@
+import sys
+
+from api.profiling import Sampler
+
+
+class First:
+    def run(self):
+        return sys._getframe()
+
+
+class Second:
+    def run(self):
+        return sys._getframe()
+
+
+def test_same_named_methods_have_distinct_frames():
+    sampler = Sampler(interval=1)
+    first = sampler.get_frame_label(First().run())
+    second = sampler.get_frame_label(Second().run())
+    assert first != second
+    assert first.startswith(f'run ({__file__}:')
+
+
+def test_stack_ends_at_root():
+    sampler = Sampler(interval=1)
+    sampler.root = sys._getframe()
+    stack = sampler.get_stack(First().run()).split(';')
+    assert stack == [
+        sampler.get_frame_label(sampler.root),
+        sampler.get_frame_label(First().run()),
+    ]
@@ -0,0 +1,74 @@
+import datetime
+import decimal
+import uuid
+
+import pytest
+from rest_framework.renderers import JSONRenderer
+
+from api.renderers import ORJSONRenderer, contains_float
+
+URLS = (
+    '/api/recipes/',
+    '/api/recipes/?limit=1&page=2',
+    '/api/recipes/{recipe}/',
+    '/api/recipes/?ids={recipe}',
+    '/api/recipes/changes/',
+    '/api/users/',
+    '/api/users/me/',
+    '/api/users/{author}/',
+    '/api/users/subscriptions/',
+    '/api/tags/',
+    '/api/ingredients/',
+    '/api/ingredients/?name=Му',
+)
+
+
+def render(renderer_class, data):
+    return renderer_class().render(data, 'application/json', {})
+
+
+def assert_same(data):
+    assert render(ORJSONRenderer, data) == render(JSONRenderer, data)
+
+
+@pytest.mark.parametrize('url', URLS)
+def test_api_payloads_match_drf(url, user_client, create_recipe, settings):
+    settings.RECIPE_CHANGES_DELAY = 0
+    create_recipe(text='Строка с разделителями и "кавычками"\n\t')
+    recipe = create_recipe(name='Оладьи')
+    response = user_client.get(
+        url.format(recipe=recipe['id'], author=recipe['author']['id'])
+    )
+    assert response.status_code == 200
+    assert not contains_float(response.data)
+    assert response.content == render(JSONRenderer, response.data)
+    assert_same(response.data)
+
+
+@pytest.mark.parametrize('value', (
+    datetime.datetime(2024, 5, 1, 12, 30, 15, 123456,
+                      tzinfo=datetime.timezone.utc),
+    datetime.datetime(2024, 5, 1, 12, 30),
+    datetime.date(2024, 5, 1),
+    datetime.time(12, 30, 15, 500),
+    decimal.Decimal('1.50'),
+    uuid.uuid4(),
+    b'bytes',
+    1e16,
+    1e-05,
+    0.1,
+    2 ** 70,
+    {1: 'int key'},
+    ('tuple', 1),
+    'control \x00\x1f\x7f and </script>',
+))
+def test_values_match_drf(value):
+    assert_same({'value': value, 'list': [value]})
+
+
+@pytest.mark.parametrize('value', (float('nan'), float('inf'), -float('inf')))
+def test_non_finite_floats_raise(value):
+    with pytest.raises(ValueError):
+        render(JSONRenderer, {'value': value})
+    with pytest.raises(ValueError):
+        render(ORJSONRenderer, {'value': [value]})
@@ -0,0 +1,58 @@
+import pytest
+from django.core.cache import cache
+
+from api.utils import SHOPPING_LIST_CACHE_KEY, get_shopping_list
+
+URL = '/api/recipes/download_shopping_cart/'
+
+
+@pytest.fixture
+def recipe(create_recipe, user_client):
+    recipe = create_recipe()
+    response = user_client.post(f'/api/recipes/{recipe["id"]}/shopping_cart/')
+    assert response.status_code == 201
+    return recipe
+
+
+def download(client):
+    response = client.get(URL)
+    assert response.status_code == 200
+    return response.content.decode()
+
+
+def test_list_is_cached(recipe, user_client, django_assert_num_queries):
+    assert download(user_client) == 'Мука, г - 200\n'
+    with django_assert_num_queries(1):
+        # Только аутентификация по токену.
+        assert download(user_client) == 'Мука, г - 200\n'
+
+
+def test_servings_change_resets_list(recipe, user_client):
+    download(user_client)
+    response = user_client.patch(
+        f'/api/recipes/{recipe["id"]}/shopping_cart/', {'servings': 3}
+    )
+    assert response.status_code == 200
+    assert download(user_client) == 'Мука, г - 600\n'
+
+
+def test_ingredient_change_resets_list(recipe, user_client, ingredient):
+    download(user_client)
+    ingredient.name = 'Мука пшеничная'
+    ingredient.measurement_unit = 'кг'
+    ingredient.save()
+    assert download(user_client) == 'Мука пшеничная, кг - 200\n'
+
+
+def test_reset_does_not_depend_on_local_cache(recipe, user, ingredient):
+    """Сброс увеличивает версию в БД, а не удаляет ключ из кеша, поэтому
+    его видят и процессы с собственным локальным кешем."""
+    get_shopping_list(user)
+    old_key = SHOPPING_LIST_CACHE_KEY.format(
+        user.id, user.shopping_list_version
+    )
+    ingredient.name = 'Соль'
+    ingredient.save()
+    assert cache.get(old_key) is not None
+    user.refresh_from_db()
+    assert get_shopping_list(user)[0]['name'] == 'Соль'
@@ -0,0 +1,95 @@
+import threading
+
+import pytest
+from django.utils import timezone
+
+from api import similarity
+from api.similarity import SimilarityIndex
+from recipes.models import Ingredient, Recipe, Tag
+
+
+@pytest.fixture
+def index(monkeypatch):
+    index = SimilarityIndex()
+    monkeypatch.setattr(similarity, 'similarity_index', index)
+    monkeypatch.setattr('api.views.similarity_index', index)
+    return index
+
+
+@pytest.fixture
+def make_recipe(user):
+    def make_recipe(name, ingredients=(), tags=()):
+        recipe = Recipe.objects.create(
+            author=user, name=name, text='Текст', cooking_time=1
+        )
+        for ingredient in ingredients:
+            recipe.composition.create(
+                ingredient=Ingredient.objects.get_or_create(
+                    name=ingredient, measurement_unit='г'
+                )[0],
+                amount=1
+            )
+        recipe.tags.add(*(
+            Tag.objects.get_or_create(name=tag, slug=tag)[0] for tag in tags
+        ))
+        return recipe
+    return make_recipe
+
+
+def test_request_does_not_build_index(index, make_recipe, client,
+                                      monkeypatch):
+    started = []
+    monkeypatch.setattr(index, 'rebuild', lambda: started.append(True))
+    recipe = make_recipe('Блины', ['мука', 'яйцо'])
+    make_recipe('Оладьи', ['мука', 'яйцо'])
+    response = client.get(f'/api/recipes/{recipe.id}/similar/')
+    assert response.status_code == 200
+    assert response.json() == []
+    assert index.is_stale()
+    for thread in threading.enumerate():
+        if thread.name == 'similarity-index':
+            thread.join()
+    assert started == [True]
+
+
+def test_similar_recipes(index, make_recipe, client, monkeypatch):
+    monkeypatch.setattr(index, 'refresh', lambda: None)
+    recipe = make_recipe('Блины', ['мука', 'яйцо', 'молоко'])
+    close = make_recipe('Оладьи', ['мука', 'яйцо', 'кефир'])
+    far = make_recipe('Хлеб', ['мука', 'дрожжи'])
+    make_recipe('Салат', ['огурец'])
+    index.build()
+    response = client.get(f'/api/recipes/{recipe.id}/similar/')
+    assert [item['id'] for item in response.json()] == [close.id, far.id]
+
+
+def test_deleted_recipes_are_excluded(index, make_recipe, monkeypatch):
+    monkeypatch.setattr(index, 'refresh', lambda: None)
+    recipe = make_recipe('Блины', ['мука', 'яйцо'])
+    deleted = make_recipe('Оладьи', ['мука', 'яйцо'])
+    Recipe.objects.filter(pk=deleted.pk).update(deleted_at=timezone.now())
+    index.build()
+    assert index.neighbours(recipe.id) == []
+    assert index.neighbours(deleted.id) is None
+
+
+def test_frequent_tags_are_down_weighted(index, make_recipe, monkeypatch):
+    monkeypatch.setattr(index, 'refresh', lambda: None)
+    recipe = make_recipe('Блины', ['мука'], ['завтрак', 'сладкое'])
+    by_rare_tag = make_recipe('Торт', [], ['сладкое'])
+    by_common_tag = make_recipe('Омлет', [], ['завтрак'])
+    for number in range(5):
+        make_recipe(f'Каша {number}', [f'крупа {number}'], ['завтрак'])
+    index.build()
+    assert index.neighbours(recipe.id)[:2] == [by_rare_tag.id,
+                                               by_common_tag.id]
+
+
+def test_features_above_limit_are_ignored(index, make_recipe, monkeypatch):
+    monkeypatch.setattr(index, 'refresh', lambda: None)
+    monkeypatch.setattr(similarity, 'MAX_POSTINGS', 2)
+    recipe = make_recipe('Блины', ['соль', 'мука'])
+    make_recipe('Суп', ['соль'])
+    make_recipe('Рагу', ['соль'])
+    index.build()
+    assert index.neighbours(recipe.id) == []
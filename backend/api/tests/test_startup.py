@@ -0,0 +1,49 @@
+import subprocess
+import sys
+
+import pytest
+from django.conf import settings
+from django.contrib.admin.sites import site
+from django.core.cache import cache
+
+from api import profiling
+from recipes.models import Recipe
+
+BOOT_SCRIPT = '''
+import sys
+import foodgram_backend.wsgi  # noqa
+from django.urls import get_resolver
+
+get_resolver().url_patterns
+print(','.join(
+    name for name in ('recipes.admin', 'tasks.admin', 'api.admin_views')
+    if name in sys.modules
+))
+'''
+
+
+def test_boot_does_not_load_admin_modules():
+    process = subprocess.run(
+        [sys.executable, '-c', BOOT_SCRIPT],
+        cwd=settings.BASE_DIR, capture_output=True, text=True, check=True
+    )
+    assert process.stdout.strip() == ''
+
+
+@pytest.fixture
+def staff_client(client, user):
+    user.is_staff = user.is_superuser = True
+    user.save()
+    client.force_login(user)
+    return client
+
+
+def test_admin_is_loaded_on_first_request(staff_client):
+    assert staff_client.get('/admin/').status_code == 200
+    assert site.is_registered(Recipe)
+
+
+def test_profiles_pages(staff_client):
+    cache.set(profiling.PROFILES_KEY, [])
+    assert staff_client.get('/admin/profiles/').status_code == 200
+    assert staff_client.get('/admin/profiles/missing/').status_code == 404
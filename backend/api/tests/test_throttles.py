@@ -0,0 +1,64 @@
+import pytest
+
+from api.throttles import ShortLinkThrottle
+from recipes.models import Recipe, User
+
+SHORT_LINK = 'MQ=='
+
+
+@pytest.fixture
+def recipe(db):
+    author = User.objects.create_user(
+        username='author', email='author@example.com', password='password',
+        first_name='Имя', last_name='Фамилия'
+    )
+    return Recipe.objects.create(
+        author=author, name='Рецепт', text='Текст', cooking_time=1,
+        short_link=SHORT_LINK
+    )
+
+
+@pytest.fixture
+def short_link_rate(monkeypatch):
+    monkeypatch.setattr(
+        ShortLinkThrottle, 'THROTTLE_RATES', {'short_link': '2/min'}
+    )
+
+
+def get(client, address, link=SHORT_LINK):
+    return client.get(f'/s/{link}/', HTTP_X_FORWARDED_FOR=address)
+
+
+def test_forwarded_addresses_get_separate_buckets(client, recipe,
+                                                  short_link_rate):
+    assert get(client, '10.0.0.1').status_code == 302
+    assert get(client, '10.0.0.1').status_code == 302
+    assert get(client, '10.0.0.1').status_code == 429
+    assert get(client, '10.0.0.2').status_code == 302
+    assert get(client, '10.0.0.2').status_code == 302
+
+
+def test_proxy_address_is_used_as_client(client, recipe, short_link_rate):
+    assert get(client, '10.0.0.3, 10.0.0.1').status_code == 302
+    assert get(client, '10.0.0.4, 10.0.0.1').status_code == 302
+    assert get(client, '10.0.0.1').status_code == 429
+
+
+def test_bucket_refills(client, recipe, short_link_rate, monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr(ShortLinkThrottle, 'timer', lambda self: now)
+    assert get(client, '10.0.0.1').status_code == 302
+    assert get(client, '10.0.0.1').status_code == 302
+    response = get(client, '10.0.0.1')
+    assert response.status_code == 429
+    assert response['Retry-After'] == '30'
+    now += 30
+    assert get(client, '10.0.0.1').status_code == 302
+    assert get(client, '10.0.0.1').status_code == 429
+
+
+def test_unknown_short_link_is_cached(client, db, django_assert_num_queries):
+    with django_assert_num_queries(1):
+        assert get(client, '10.0.0.1', 'unknown').status_code == 404
+    with django_assert_num_queries(0):
+        assert get(client, '10.0.0.1', 'unknown').status_code == 404
@@ -0,0 +1,85 @@
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    """Ограничение частоты запросов по алгоритму token bucket.
+
+    Корзина клиента вмещает num_requests токенов и пополняется
+    равномерно со скоростью num_requests за duration секунд, поэтому
+    допускаются короткие всплески без превышения средней частоты.
+    Состояние корзины хранится в кеше Django. Клиент определяется
+    по пользователю или, для анонимных запросов, по IP-адресу из
+    X-Forwarded-For с учётом NUM_PROXIES.
+    """
+    cache_format = 'throttle_gcra_%(scope)s_%(ident)s'
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+    def allow_request(self, request, view):
+        """Проверяет корзину по алгоритму GCRA.
+
+        В кеше хранится теоретическое время следующего запроса (TAT)
+        в миллисекундах. Каждый запрос атомарно сдвигает его через
+        cache.incr() на интервал между токенами, поэтому одновременные
+        запросы одного клиента не могут прочитать одно и то же
+        состояние и потратить один токен. Отклонённый запрос
+        возвращает свой интервал через cache.decr().
+
+        Если TAT оказался в прошлом (корзина полна), он заменяется
+        на текущее время через cache.set(). Эта запись не атомарна:
+        приращения запросов, пришедших в тот же момент, могут
+        потеряться, и после простоя клиент получает не больше
+        нескольких лишних токенов.
+        """
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        now = int(self.timer() * 1000)
+        interval = max(1, self.duration * 1000 // self.num_requests)
+        burst = interval * self.num_requests
+        if self.cache.add(self.key, now + interval, self.duration):
+            return True
+        try:
+            tat = self.cache.incr(self.key, interval)
+        except ValueError:
+            # Ключ истёк между add() и incr().
+            self.cache.set(self.key, now + interval, self.duration)
+            return True
+        if tat - interval < now:
+            self.cache.set(self.key, now + interval, self.duration)
+            return True
+        if tat - now > burst:
+            self.cache.decr(self.key, interval)
+            self.wait_time = (tat - now - burst) / 1000
+            return False
+        self.cache.touch(self.key, self.duration)
+        return True
+
+    def wait(self):
+        return self.wait_time
+
+
+class ShortLinkThrottle(TokenBucketThrottle):
+    scope = 'short_link'
+
+
+class IngredientSearchThrottle(TokenBucketThrottle):
+    scope = 'ingredient_search'
+
+
+class AnonRecipeFeedThrottle(TokenBucketThrottle):
+    """Ограничивает только просмотр рецептов анонимными клиентами."""
+    scope = 'anon_recipe_feed'
+
+    def allow_request(self, request, view):
+        if (request.user.is_authenticated
+                or view.action not in ('list', 'retrieve')):
+            return True
+        return super().allow_request(request, view)
@@ -8,6 +8,7 @@ router.register('users', views.UserViewSet, basename='users')
 router.register('tags', views.TagViewSet)
 router.register('ingredients', views.IngredientViewSet)
 router.register('recipes', views.RecipeViewSet, basename='recipe')
+router.register('tasks', views.TaskViewSet, basename='tasks')
 
 urlpatterns = [
     path('', include(router.urls)),
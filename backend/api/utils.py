@@ -1,6 +1,35 @@
-from django.db.models import F, Sum
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from uuid import uuid4
 
-from recipes.models import RecipeComposition, User
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, router, transaction
+from django.db.models import Count, Exists, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from api.metrics import CACHE_REQUESTS
+from recipes.models import (Ingredient, Recipe, RecipeChange,
+                            RecipeComposition, ShoppingCart, Subscribtions,
+                            User)
+
+# Единицы измерения, приводимые к базовой при суммировании.
+UNIT_CONVERSIONS = {
+    'кг': ('г', 1000),
+    'л': ('мл', 1000),
+}
+# Более крупные единицы для вывода больших количеств.
+LARGER_UNITS = {
+    'г': ('кг', 1000),
+    'мл': ('л', 1000),
+}
+SHOPPING_LIST_CACHE_KEY = 'shopping_list:{}:{}'
+SHORT_LINK_CACHE_KEY = 'short_link:{}'
+RECIPES_VERSION_KEY = 'recipes:version'
+RECIPE_FLAGS = ('is_favorited', 'is_in_shopping_cart', 'author_is_subscribed')
+RECIPE_RELATIONS = ('tags', 'author', 'ingredients')
 
 
 def save_ingredients(recipe, ingredients):
@@ -15,27 +44,509 @@ def save_ingredients(recipe, ingredients):
     RecipeComposition.objects.bulk_create(recipe_compositions)
 
 
-def get_obj_list(instance, request, action):
-    if action == 'favorite':
-        return User.objects.filter(
-            favorites=instance,
-            id=request.user.id
+def update_ingredients(recipe, ingredients):
+    """Приводит состав рецепта к переданному списку ингредиентов.
+
+    Вместо полной перезаписи состава изменяются только отличающиеся
+    записи: новые ингредиенты добавляются, изменённые количества
+    обновляются, отсутствующие в списке ингредиенты удаляются.
+    """
+    existing = {
+        composition.ingredient_id: composition
+        for composition in recipe.composition.all()
+    }
+    to_create = []
+    to_update = []
+    for ingredient in ingredients:
+        composition = existing.pop(ingredient['ingredient'].id, None)
+        if composition is None:
+            to_create.append(ingredient)
+        elif composition.amount != ingredient['amount']:
+            composition.amount = ingredient['amount']
+            to_update.append(composition)
+    if existing:
+        RecipeComposition.objects.filter(
+            id__in=[composition.id for composition in existing.values()]
+        ).delete()
+    if to_update:
+        RecipeComposition.objects.bulk_update(to_update, ('amount',))
+    if to_create:
+        save_ingredients(recipe, to_create)
+
+
+def update_tags(recipe, tags):
+    """Приводит теги рецепта к переданному списку, изменяя только
+    отличающиеся связи."""
+    RecipeTag = Recipe.tags.through
+    current = {tag.id for tag in recipe.tags.all()}
+    new = {tag.id for tag in tags}
+    if current - new:
+        RecipeTag.objects.filter(
+            recipe=recipe, tag_id__in=current - new
+        ).delete()
+    if new - current:
+        RecipeTag.objects.bulk_create(
+            RecipeTag(recipe=recipe, tag_id=tag_id)
+            for tag_id in new - current
         )
-    elif action == 'shopping_cart':
-        return User.objects.filter(
-            shopping_cart=instance,
-            id=request.user.id
+
+
+RECIPE_LISTS = {
+    'favorite': User.favorites.through,
+    'shopping_cart': ShoppingCart,
+}
+
+
+def insert_links(through, source_field, source_id, target_field, target_ids,
+                 **extra):
+    """Создаёт связи source -> target в промежуточной таблице through.
+
+    Выполняется одним запросом INSERT ... SELECT ... ON CONFLICT DO NOTHING:
+    несуществующие и помеченные на удаление объекты target и уже
+    существующие связи пропускаются.
+    В extra передаются значения дополнительных полей связи, для остальных
+    полей используются значения по умолчанию.
+    Возвращает количество созданных связей.
+    """
+    if not target_ids:
+        return 0
+    extra = {
+        field.name: extra.get(field.name, field.get_default())
+        for field in through._meta.concrete_fields
+        if not field.primary_key
+        and field.name not in (source_field, target_field)
+    }
+    connection = connections[router.db_for_write(through)]
+    quote = connection.ops.quote_name
+    target_model = through._meta.get_field(target_field).related_model
+    target_pk = quote(target_model._meta.pk.column)
+    columns = [
+        quote(through._meta.get_field(field).column)
+        for field in (source_field, target_field, *extra)
+    ]
+    values = ', '.join(['%s', target_pk, *['%s'] * len(extra)])
+    target_fields = {
+        field.name: field for field in target_model._meta.concrete_fields
+    }
+    not_deleted = ''
+    if 'deleted_at' in target_fields:
+        deleted_at = quote(target_fields['deleted_at'].column)
+        not_deleted = f'AND {deleted_at} IS NULL '
+    sql = (
+        f'INSERT INTO {quote(through._meta.db_table)} '
+        f'({", ".join(columns)}) '
+        f'SELECT {values} FROM {quote(target_model._meta.db_table)} '
+        f'WHERE {target_pk} IN ({", ".join(["%s"] * len(target_ids))}) '
+        f'{not_deleted}ON CONFLICT DO NOTHING'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [source_id, *extra.values(), *target_ids])
+        return cursor.rowcount
+
+
+def touch_user(user, shopping_list=False):
+    """Обновляет дату изменения пользователя при изменении его избранного,
+    списка покупок или подписок: от них зависят ответы API, которые он
+    получает, и их валидаторы для условных запросов. При shopping_list
+    тем же запросом увеличивается версия его списка покупок."""
+    user.updated_at = timezone.now()
+    fields = {'updated_at': user.updated_at}
+    if shopping_list:
+        fields['shopping_list_version'] = F('shopping_list_version') + 1
+    User.objects.filter(pk=user.pk).update(**fields)
+
+
+def add_to_list(action, user, recipe_ids, **extra):
+    """Добавляет рецепты в список избранного или покупок пользователя.
+    Возвращает количество добавленных рецептов."""
+    added = insert_links(
+        RECIPE_LISTS[action], 'user', user.id, 'recipe', recipe_ids, **extra
+    )
+    if added:
+        touch_user(user, shopping_list=action == 'shopping_cart')
+    return added
+
+
+def remove_from_list(action, user, recipe_ids):
+    """Удаляет рецепты из списка избранного или покупок пользователя
+    одним запросом DELETE. Возвращает количество удалённых рецептов."""
+    deleted, _ = RECIPE_LISTS[action].objects.filter(
+        user=user, recipe_id__in=recipe_ids
+    ).delete()
+    if deleted:
+        touch_user(user, shopping_list=action == 'shopping_cart')
+    return deleted
+
+
+def set_servings(user, recipe_id, servings):
+    """Изменяет количество порций рецепта в списке покупок.
+    Возвращает количество изменённых записей."""
+    updated = ShoppingCart.objects.filter(
+        user=user, recipe_id=recipe_id
+    ).update(servings=servings)
+    if updated:
+        touch_user(user, shopping_list=True)
+    return updated
+
+
+def subscribe(user, author_ids):
+    """Подписывает пользователя на авторов, пропуская его самого.
+    Возвращает количество новых подписок."""
+    added = insert_links(
+        Subscribtions, 'subscriber', user.id, 'user',
+        [author_id for author_id in author_ids if author_id != user.id]
+    )
+    if added:
+        touch_user(user)
+    return added
+
+
+def unsubscribe(user, author_ids):
+    """Отписывает пользователя от авторов одним запросом DELETE.
+    Возвращает количество удалённых подписок."""
+    deleted, _ = Subscribtions.objects.filter(
+        subscriber=user, user_id__in=author_ids
+    ).delete()
+    if deleted:
+        touch_user(user)
+    return deleted
+
+
+def annotate_recipe_flags(queryset, user, flags=RECIPE_FLAGS):
+    """Добавляет к рецептам признаки из flags (по умолчанию все:
+    is_favorited, is_in_shopping_cart и author_is_subscribed) для
+    текущего пользователя."""
+    if not user.is_authenticated:
+        return queryset.annotate(**{flag: Value(False) for flag in flags})
+    annotations = {
+        'is_favorited': lambda: Exists(
+            RECIPE_LISTS['favorite'].objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )
+        ),
+        'is_in_shopping_cart': lambda: Exists(
+            RECIPE_LISTS['shopping_cart'].objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )
+        ),
+        'author_is_subscribed': lambda: Exists(
+            Subscribtions.objects.filter(
+                subscriber=user, user=OuterRef('author')
+            )
+        ),
+    }
+    return queryset.annotate(
+        **{flag: annotations[flag]() for flag in flags}
+    )
+
+
+def count_recipes():
+    """Число рецептов пользователя без помеченных на удаление."""
+    return Count('recipes', filter=Q(recipes__deleted_at__isnull=True))
+
+
+def annotate_recipes_count(queryset):
+    """Добавляет к пользователям число их рецептов подзапросом, который
+    выполняется только для строк страницы по индексу автора."""
+    recipes = (
+        Recipe.objects.filter(author=OuterRef('pk'))
+        .order_by()
+        .values('author')
+        .annotate(count=Count('*'))
+        .values('count')
+    )
+    return queryset.annotate(recipes_count=Coalesce(Subquery(recipes), 0))
+
+
+def annotate_is_subscribed(queryset, user):
+    """Добавляет к пользователям признак подписки на них текущего
+    пользователя."""
+    if not user.is_authenticated:
+        return queryset.annotate(is_subscribed=Value(False))
+    return queryset.annotate(
+        is_subscribed=Exists(
+            Subscribtions.objects.filter(
+                subscriber=user, user=OuterRef('pk')
+            )
         )
+    )
 
 
-def get_ingredients(queryset):
-    ingredients = (
+def get_recipe_tags(recipe_ids, expand):
+    tags = defaultdict(list)
+    recipe_tags = (
+        Recipe.tags.through.objects
+        .filter(recipe_id__in=recipe_ids)
+        .order_by('tag_id')
+    )
+    if not expand:
+        for recipe_id, tag_id in recipe_tags.values_list(
+            'recipe_id', 'tag_id'
+        ):
+            tags[recipe_id].append(tag_id)
+        return tags
+    for recipe_id, tag_id, name, slug in recipe_tags.values_list(
+        'recipe_id', 'tag_id', 'tag__name', 'tag__slug'
+    ):
+        tags[recipe_id].append({'id': tag_id, 'name': name, 'slug': slug})
+    return tags
+
+
+def get_recipe_ingredients(recipe_ids, expand):
+    ingredients = defaultdict(list)
+    compositions = (
         RecipeComposition.objects
-        .filter(recipe__in=queryset)
-        .values(
-            name=F('ingredient__name'),
-            measurement_unit=F('ingredient__measurement_unit')
+        .filter(recipe_id__in=recipe_ids)
+        .order_by('id')
+    )
+    if not expand:
+        for recipe_id, ingredient_id, amount in compositions.values_list(
+            'recipe_id', 'ingredient_id', 'amount'
+        ):
+            ingredients[recipe_id].append(
+                {'id': ingredient_id, 'amount': amount}
+            )
+        return ingredients
+    for recipe_id, ingredient_id, name, unit, amount in (
+        compositions.values_list(
+            'recipe_id', 'ingredient_id', 'ingredient__name',
+            'ingredient__measurement_unit', 'amount'
         )
-        .annotate(amount=Sum('amount'))
+    ):
+        ingredients[recipe_id].append({
+            'id': ingredient_id,
+            'name': name,
+            'measurement_unit': unit,
+            'amount': amount,
+        })
+    return ingredients
+
+
+def attach_recipe_relations(rows, fields=RECIPE_RELATIONS,
+                            expand=RECIPE_RELATIONS):
+    """Дополняет строки рецептов связями из fields: тегами, автором
+    и ингредиентами.
+
+    Теги и ингредиенты всех рецептов страницы получаются одним запросом
+    каждые. Данные автора берутся из столбцов author__* самой строки.
+    Связи, не входящие в expand, представляются только id (для
+    ингредиентов - id и количеством) и не требуют соединения таблиц.
+    """
+    rows = list(rows)
+    recipe_ids = [row['id'] for row in rows]
+    if 'tags' in fields:
+        tags = get_recipe_tags(recipe_ids, 'tags' in expand)
+    if 'ingredients' in fields:
+        ingredients = get_recipe_ingredients(
+            recipe_ids, 'ingredients' in expand
+        )
+    for row in rows:
+        if 'tags' in fields:
+            row['tags'] = tags[row['id']]
+        if 'ingredients' in fields:
+            row['ingredients'] = ingredients[row['id']]
+        if 'author' not in fields:
+            continue
+        if 'author' not in expand:
+            row['author'] = row['author_id']
+            continue
+        row['author'] = {
+            column[len('author__'):]: value
+            for column, value in row.items()
+            if column.startswith('author__')
+        }
+        row['author']['is_subscribed'] = row['author_is_subscribed']
+    return rows
+
+
+def get_recipe_changes(since, limit):
+    """Возвращает изменения рецептов после курсора since.
+
+    Несколько изменений одного рецепта сворачиваются в одно: созданный
+    и затем изменённый рецепт считается созданным, удалённый - удалённым.
+    Без since возвращается только текущий курсор, от которого клиент,
+    загрузивший все рецепты, может продолжать синхронизацию.
+    """
+    changes = RecipeChange.objects.filter(
+        created_at__lte=(
+            timezone.now()
+            - timedelta(seconds=settings.RECIPE_CHANGES_DELAY)
+        )
+    )
+    result = {
+        'cursor': since,
+        'has_more': False,
+        RecipeChange.CREATED: [],
+        RecipeChange.UPDATED: [],
+        RecipeChange.DELETED: [],
+    }
+    if since is None:
+        result['cursor'] = (
+            changes.order_by('-id').values_list('id', flat=True).first() or 0
+        )
+        return result
+    rows = list(
+        changes.filter(id__gt=since).order_by('id')
+        .values_list('id', 'recipe_id', 'action')[:limit + 1]
+    )
+    if len(rows) > limit:
+        result['has_more'] = True
+        rows = rows[:limit]
+    actions = {}
+    for change_id, recipe_id, action in rows:
+        first = actions.get(recipe_id, action)
+        if action == RecipeChange.DELETED or first != RecipeChange.CREATED:
+            first = action
+        actions[recipe_id] = first
+        result['cursor'] = change_id
+    for recipe_id, action in actions.items():
+        result[action].append(recipe_id)
+    return result
+
+
+def get_summary(ingredients):
+    """Строит сводку по составу рецепта из проверенных данных
+    сериализатора."""
+    return Recipe.build_summary(
+        (ingredient['ingredient'], ingredient['amount'])
+        for ingredient in ingredients
+    )
+
+
+def normalize_amount(amount, unit):
+    """Приводит количество к базовой единице измерения."""
+    if unit in UNIT_CONVERSIONS:
+        unit, factor = UNIT_CONVERSIONS[unit]
+        amount *= factor
+    return amount, unit
+
+
+def humanize_amount(amount, unit):
+    """Выражает большое количество в более крупной единице измерения."""
+    if unit in LARGER_UNITS and amount >= LARGER_UNITS[unit][1]:
+        unit, factor = LARGER_UNITS[unit]
+        return Decimal(amount) / factor, unit
+    return amount, unit
+
+
+def get_cart_summaries(user):
+    """Сводки составов и число порций рецептов из списка покупок."""
+    return ShoppingCart.objects.filter(
+        user=user, recipe__deleted_at__isnull=True
+    ).values_list('recipe__summary', 'servings')
+
+
+def get_ingredients(user):
+    """Суммирует ингредиенты рецептов из списка покупок пользователя.
+
+    Количества берутся из Recipe.summary и умножаются на число порций,
+    указанное для рецепта в списке покупок, таблица состава рецептов
+    не используется. Совместимые единицы измерения приводятся
+    к базовой (кг - к г, л - к мл), суммирование выполняется в целых
+    числах Python без ограничения разрядности.
+    """
+    totals = defaultdict(int)
+    for summary, servings in get_cart_summaries(user):
+        for ingredient_id, amount in zip(
+            summary.get('ingredient_ids', ()), summary.get('amounts', ())
+        ):
+            totals[ingredient_id] += amount * servings
+    ingredients = (
+        Ingredient.objects
+        .filter(id__in=totals)
+        .order_by('name')
+        .values_list('id', 'name', 'measurement_unit')
+    )
+    result = []
+    for ingredient_id, name, unit in ingredients:
+        amount, unit = humanize_amount(
+            *normalize_amount(totals[ingredient_id], unit)
+        )
+        result.append(
+            {'name': name, 'measurement_unit': unit, 'amount': amount}
+        )
+    return result
+
+
+def get_shopping_list(user):
+    """Возвращает список покупок пользователя, кешируя результат
+    до изменения списка покупок, состава входящих в него рецептов или
+    их ингредиентов.
+
+    Ключ кеша содержит User.shopping_list_version, которую увеличивает
+    invalidate_shopping_lists(). Версия хранится в БД и загружается
+    вместе с пользователем, поэтому сброс виден всем процессам, даже
+    если у каждого свой локальный кеш.
+    """
+    key = SHOPPING_LIST_CACHE_KEY.format(user.id, user.shopping_list_version)
+    shopping_list = cache.get(key)
+    CACHE_REQUESTS.inc(
+        'shopping_list', 'miss' if shopping_list is None else 'hit'
+    )
+    if shopping_list is None:
+        shopping_list = get_ingredients(user)
+        cache.set(key, shopping_list, settings.SHOPPING_LIST_CACHE_TIMEOUT)
+    return shopping_list
+
+
+def format_shopping_list(ingredients):
+    """Возвращает список покупок в виде текста, по строке
+    на ингредиент."""
+    return ''.join(
+        f"{ingredient['name']}, "
+        f"{ingredient['measurement_unit']} - {ingredient['amount']}\n"
+        for ingredient in ingredients
+    )
+
+
+def invalidate_shopping_lists(user_ids):
+    """Увеличивает версию списков покупок пользователей. Принимает
+    список id или запрос, который выполняется подзапросом."""
+    User.all_objects.filter(pk__in=user_ids).update(
+        shopping_list_version=F('shopping_list_version') + 1
     )
-    return list(ingredients)
+
+
+def invalidate_recipe_shopping_lists(recipe_ids):
+    """Сбрасывает списки покупок всех пользователей, у которых в списке
+    есть рецепты с изменённым составом."""
+    invalidate_shopping_lists(
+        ShoppingCart.objects
+        .filter(recipe_id__in=recipe_ids)
+        .values_list('user_id', flat=True)
+    )
+
+
+def invalidate_ingredient_shopping_lists(ingredient_id):
+    """Сбрасывает списки покупок, в которые входит ингредиент, например
+    после изменения его названия или единицы измерения."""
+    invalidate_recipe_shopping_lists(
+        RecipeComposition.objects
+        .filter(ingredient_id=ingredient_id)
+        .values_list('recipe_id', flat=True)
+    )
+
+
+def touch_recipes(recipe_ids):
+    """Обновляет дату изменения рецептов, ответы о которых изменились
+    без их сохранения (например, после переименования тега или
+    ингредиента): от неё зависят валидаторы условных запросов. Изменения
+    записываются в ленту, а закешированные ответы сбрасываются.
+    Принимает список id или запрос."""
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    Recipe.objects.filter(pk__in=recipe_ids).update(updated_at=timezone.now())
+    RecipeChange.record(recipe_ids, RecipeChange.UPDATED)
+    transaction.on_commit(bump_recipes_version)
+
+
+def get_recipes_version():
+    """Возвращает текущую версию данных рецептов для ключей кеша
+    ответов."""
+    return cache.get_or_set(RECIPES_VERSION_KEY, uuid4().hex, None)
+
+
+def bump_recipes_version():
+    """Делает недействительными все закешированные ответы с рецептами."""
+    cache.set(RECIPES_VERSION_KEY, uuid4().hex, None)
@@ -0,0 +1,148 @@
+from django.core.files.storage import default_storage
+
+
+class ValuesSerializer:
+    """Лёгкий сериализатор только для чтения.
+
+    Строит словари напрямую из строк QuerySet.values(), не создавая
+    экземпляры моделей и полей DRF. Результат совпадает с выводом
+    соответствующего ModelSerializer.
+    - columns - столбцы, запрашиваемые через .values();
+    - fields - ключи результата в порядке вывода;
+    - expandable - вложенные объекты, которые можно заменить на id;
+    - optional_fields - поля, выводимые только по явному запросу.
+
+    Параметры fields и expand конструктора задают выборочный вывод:
+    selected - выводимые поля, expanded - разворачиваемые вложенные
+    объекты. None означает все поля, кроме optional_fields, или все
+    вложенные объекты.
+    """
+    __slots__ = ('context', 'selected', 'expanded')
+    columns = ()
+    fields = ()
+    expandable = ()
+    optional_fields = ()
+
+    def __init__(self, context=None, fields=None, expand=None):
+        self.context = context or {}
+        self.selected = tuple(
+            field for field in self.fields
+            if field not in self.optional_fields
+        )
+        if fields is not None:
+            self.selected = tuple(
+                field for field in self.fields if field in fields
+            )
+        self.expanded = frozenset(
+            self.expandable if expand is None else expand
+        )
+
+    def get_columns(self):
+        """Столбцы, нужные для выбранных полей."""
+        return [
+            column for column in self.columns
+            if column == 'id' or column in self.selected
+        ]
+
+    def to_representation(self, row):
+        return {field: row[field] for field in self.selected}
+
+    def to_representation_many(self, rows):
+        return [self.to_representation(row) for row in rows]
+
+    def get_file_url(self, name):
+        """Повторяет вывод serializers.ImageField для имени файла."""
+        if not name:
+            return None
+        url = default_storage.url(name)
+        request = self.context.get('request')
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
+
+
+class TagValuesSerializer(ValuesSerializer):
+    """Аналог TagSerializer."""
+    __slots__ = ()
+    columns = fields = ('id', 'name', 'slug')
+
+
+class IngredientValuesSerializer(ValuesSerializer):
+    """Аналог IngredientSerializer."""
+    __slots__ = ()
+    columns = fields = ('id', 'name', 'measurement_unit')
+
+
+class UserValuesSerializer(ValuesSerializer):
+    """Аналог GetUserSerializer.
+
+    Ожидает в строке ключ is_subscribed с уже вычисленным значением,
+    а если запрошено поле recipes_count - и число рецептов.
+    """
+    __slots__ = ()
+    columns = ('email', 'id', 'username', 'first_name', 'last_name',
+               'avatar')
+    fields = ('email', 'id', 'username', 'first_name', 'last_name',
+              'is_subscribed', 'avatar', 'recipes_count')
+    optional_fields = ('recipes_count',)
+
+    def to_representation(self, row):
+        representation = super().to_representation(row)
+        if 'avatar' in representation:
+            representation['avatar'] = self.get_file_url(row['avatar'])
+        return representation
+
+
+class RecipeValuesSerializer(ValuesSerializer):
+    """Аналог RecipeSerializer.
+
+    Ожидает в строке рецепта уже собранные значения выбранных полей:
+    - tags - список строк тегов или, если теги не развёрнуты, их id;
+    - author - строка автора для UserValuesSerializer или id автора;
+    - ingredients - список строк с ключами id, name, measurement_unit
+      и amount (без name и measurement_unit, если они не развёрнуты);
+    - is_favorited и is_in_shopping_cart.
+    """
+    __slots__ = ('tag_serializer', 'user_serializer', 'ingredient_fields')
+    columns = ('id', 'author_id', 'name', 'image', 'text', 'cooking_time',
+               'summary')
+    fields = ('id', 'tags', 'author', 'ingredients', 'is_favorited',
+              'is_in_shopping_cart', 'name', 'image', 'text',
+              'cooking_time', 'summary')
+    expandable = ('tags', 'author', 'ingredients')
+
+    def __init__(self, context=None, fields=None, expand=None):
+        super().__init__(context, fields, expand)
+        self.tag_serializer = TagValuesSerializer(self.context)
+        self.user_serializer = UserValuesSerializer(self.context)
+        self.ingredient_fields = ('id', 'amount')
+        if 'ingredients' in self.expanded:
+            self.ingredient_fields = (
+                'id', 'name', 'measurement_unit', 'amount'
+            )
+
+    def get_columns(self):
+        return [
+            column for column in self.columns
+            if column == 'id' or column in self.selected
+            or column == 'author_id' and 'author' in self.selected
+        ]
+
+    def to_representation(self, row):
+        representation = {}
+        for field in self.selected:
+            value = row[field]
+            if field in self.expanded and field == 'tags':
+                value = self.tag_serializer.to_representation_many(value)
+            elif field in self.expanded and field == 'author':
+                value = self.user_serializer.to_representation(value)
+            elif field == 'ingredients':
+                value = [
+                    {key: ingredient[key]
+                     for key in self.ingredient_fields}
+                    for ingredient in value
+                ]
+            elif field == 'image':
+                value = self.get_file_url(value)
+            representation[field] = value
+        return representation
@@ -1,26 +1,44 @@
-from django.db.models import Prefetch
+from functools import partial
+from ipaddress import ip_address, ip_network
+
+from django.conf import settings as django_settings
+from django.db.models import Count, Max, Prefetch, Value
 from django.contrib.auth.hashers import make_password
-from django.http import HttpResponse
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, HttpResponse
 from django.shortcuts import get_object_or_404, redirect
+from django.utils.cache import get_conditional_response, patch_vary_headers
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.conf import settings
 from djoser.serializers import SetPasswordSerializer
 from djoser.views import UserViewSet as DjoserUserViewSet
 from rest_framework import status
-from rest_framework.decorators import action, api_view
-from rest_framework.mixins import (ListModelMixin,
-                                   RetrieveModelMixin)
+from rest_framework.decorators import action, api_view, throttle_classes
+from rest_framework.exceptions import ValidationError
+from rest_framework.mixins import RetrieveModelMixin
+from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
+from rest_framework.settings import api_settings
 from rest_framework.viewsets import GenericViewSet, ModelViewSet
 
-from . import serializers, utils
-from .filters import IngredientFilter, RecipeFilter
+from . import metrics, serializers, utils, values_serializers
+from .coalescing import get_or_compute
+from .filters import IngredientFilter, RecipeFilter, UserFilter
+from .mixins import ConditionalGetMixin, ValuesListModelMixin
 from .paginators import LimitPagination
 from .permissions import UserStaffOrReadOnly
+from .similarity import similarity_index
+from .tasks import export_shopping_cart
+from .throttles import (AnonRecipeFeedThrottle, IngredientSearchThrottle,
+                        ShortLinkThrottle)
+from recipes.deletion import delete_recipes
 from recipes.models import Ingredient, Recipe, RecipeComposition, Tag, User
+from tasks.models import Task
 
 
-class UserViewSet(DjoserUserViewSet):
+class UserViewSet(ConditionalGetMixin, ValuesListModelMixin,
+                  DjoserUserViewSet):
     """
     ViewSet, отвечающий за работу с пользователями.
 
@@ -28,9 +46,93 @@ class UserViewSet(DjoserUserViewSet):
     - set_avatar() - обеспечивает функцию изменения аватара;
     - subscriptions() - обеспечивает функцию просмотра подписок пользователя;
     - subscribe() - обеспечивает функцию дабавления/удаления подписок на
-      других пользователей.
+      других пользователей;
+    - subscribe_batch() - добавляет или удаляет подписки на нескольких
+      пользователей одним запросом.
+    Список пользователей, профиль и me поддерживают условные запросы
+    и выборочный вывод полей (?fields=). Список упорядочен по логину,
+    поддерживает поиск (?search=) и по запросу выводит число рецептов
+    (?fields=...,recipes_count).
     """
     pagination_class = LimitPagination
+    lookup_value_regex = r'\d+'
+    values_serializer_class = values_serializers.UserValuesSerializer
+    filter_backends = (DjangoFilterBackend,)
+    filterset_class = UserFilter
+
+    def list(self, request, *args, **kwargs):
+        get_response = partial(super().list, request, *args, **kwargs)
+        if self.action != 'list':
+            return get_response()
+        return self.conditional_response(
+            self.get_list_validators(), get_response, last_modified=False
+        )
+
+    def get_recipes_validators(self, users):
+        """Число и дата последнего изменения рецептов пользователей,
+        если запрошено поле recipes_count: создание и удаление рецепта
+        не меняет самого пользователя."""
+        if 'recipes_count' not in (self.get_query_list('fields') or ()):
+            return ()
+        return tuple(
+            Recipe.objects.filter(author__in=users.values('pk'))
+            .aggregate(count=Count('pk'), modified=Max('updated_at'))
+            .values()
+        )
+
+    def get_list_validators(self):
+        return (
+            *super().get_list_validators(),
+            *self.get_recipes_validators(
+                self.filter_queryset(self.get_queryset())
+            )
+        )
+
+    def get_object_validators(self):
+        validators = super().get_object_validators()
+        if validators is None:
+            return None
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        return (
+            *validators,
+            *self.get_recipes_validators(User.objects.filter(
+                **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+            ))
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        get_response = partial(super().retrieve, request, *args, **kwargs)
+        if self.action == 'me':
+            if self.is_sparse():
+                get_response = partial(
+                    self.retrieve_values, pk=request.user.pk
+                )
+            return self.conditional_response(
+                (
+                    request.user.updated_at,
+                    *self.get_recipes_validators(
+                        User.objects.filter(pk=request.user.pk)
+                    )
+                ),
+                get_response
+            )
+        if self.is_sparse():
+            get_response = self.retrieve_values
+        return self.conditional_response(
+            self.get_object_validators(), get_response
+        )
+
+    def get_values_queryset(self, queryset, serializer):
+        annotations = []
+        if 'is_subscribed' in serializer.selected:
+            queryset = utils.annotate_is_subscribed(
+                queryset, self.request.user
+            )
+            annotations.append('is_subscribed')
+        if 'recipes_count' in serializer.selected:
+            queryset = utils.annotate_recipes_count(queryset)
+            annotations.append('recipes_count')
+        return queryset.values(*serializer.get_columns(), *annotations)
 
     def update(self, request, *args, **kwargs):
         return Response(status=status.HTTP_405_METHOD_NOT_ALLOWED)
@@ -47,8 +149,15 @@ class UserViewSet(DjoserUserViewSet):
         if self.action == 'subscriptions':
             return (
                 User.objects.filter(subscribers=user)
+                .annotate(
+                    recipes_count=utils.count_recipes(),
+                    subscribed=Value(True)
+                )
                 .prefetch_related('recipes')
+                .order_by('username')
             )
+        if self.action == 'list':
+            return queryset.order_by('username')
         return queryset
 
     def get_serializer_class(self):
@@ -63,6 +172,8 @@ class UserViewSet(DjoserUserViewSet):
             return serializers.AvatarSerializer
         elif self.action == 'subscriptions' or self.action == 'subscribe':
             return serializers.SubscriptionSerializer
+        elif self.action == 'subscribe_batch':
+            return serializers.UserBatchSerializer
         return serializers.GetUserSerializer
 
     def get_permissions(self):
@@ -85,14 +196,52 @@ class UserViewSet(DjoserUserViewSet):
 
     @action(['post', 'delete'], detail=True,)
     def subscribe(self, request, *args, **kwargs):
-        return self.post_delete(request, *args, **kwargs)
+        author_id = int(kwargs['id'])
+        if author_id == request.user.id:
+            raise ValidationError({
+                api_settings.NON_FIELD_ERRORS_KEY: [
+                    'Нельзя подписаться на самого себя'
+                ]
+            })
+        if request.method == 'POST':
+            author = get_object_or_404(
+                User.objects.annotate(
+                    recipes_count=utils.count_recipes(),
+                    subscribed=Value(True)
+                ),
+                pk=author_id
+            )
+            if not utils.subscribe(request.user, [author_id]):
+                raise ValidationError({
+                    api_settings.NON_FIELD_ERRORS_KEY: [
+                        'Вы уже подписаны на данного пользователя'
+                    ]
+                })
+            serializer = self.get_serializer(author)
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        elif request.method == 'DELETE':
+            if not utils.unsubscribe(request.user, [author_id]):
+                get_object_or_404(User, pk=author_id)
+                raise ValidationError({
+                    api_settings.NON_FIELD_ERRORS_KEY: [
+                        'Вы не подписаны на данного пользователя'
+                    ]
+                })
+            return Response(status=status.HTTP_204_NO_CONTENT)
 
-    def post_delete(self, request, *args, **kwargs):
-        if self.action == 'subscribe':
-            instance = get_object_or_404(User, pk=kwargs['id'])
-        elif self.action == 'set_avatar':
-            instance = request.user
+    @action(['post', 'delete'], detail=False, url_path='subscribe')
+    def subscribe_batch(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        author_ids = serializer.validated_data['users']
+        if request.method == 'POST':
+            count = utils.subscribe(request.user, author_ids)
+        elif request.method == 'DELETE':
+            count = utils.unsubscribe(request.user, author_ids)
+        return Response({'count': count}, status=status.HTTP_200_OK)
 
+    def post_delete(self, request, *args, **kwargs):
+        instance = request.user
         serializer = self.get_serializer(instance, data=request.data)
         serializer.is_valid(raise_exception=True)
         serializer.save()
@@ -104,31 +253,51 @@ class UserViewSet(DjoserUserViewSet):
             return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class TagViewSet(RetrieveModelMixin, ListModelMixin, GenericViewSet):
+class TagViewSet(RetrieveModelMixin, ValuesListModelMixin, GenericViewSet):
     """ViewSet для тегов."""
     queryset = Tag.objects.all()
     serializer_class = serializers.TagSerializer
+    values_serializer_class = values_serializers.TagValuesSerializer
 
 
-class IngredientViewSet(RetrieveModelMixin, ListModelMixin, GenericViewSet):
+class IngredientViewSet(RetrieveModelMixin, ValuesListModelMixin,
+                        GenericViewSet):
     """ViewSet для ингредиентов."""
     queryset = Ingredient.objects.all()
     serializer_class = serializers.IngredientSerializer
+    values_serializer_class = values_serializers.IngredientValuesSerializer
+    throttle_classes = (IngredientSearchThrottle,)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
 
 
-class RecipeViewSet(ModelViewSet):
+class RecipeViewSet(ConditionalGetMixin, ValuesListModelMixin,
+                    ModelViewSet):
     """
     ViewSet, отвечающий за работу с рецептами.
 
     Даёт возможность просмтотра, создания, изменения и удаления рецептов.
+    Список рецептов строится из QuerySet.values() без создания экземпляров
+    моделей: теги и ингредиенты страницы получаются одним запросом каждые.
+    PATCH-запрос с параметром ?partial=1 изменяет только переданные поля,
+    не затрагивая теги и ингредиенты. Список и рецепт поддерживают
+    условные запросы (ETag, Last-Modified).
     - get_short_link() - возвращает короткую ссылку на рецепт;
     - favorite() - добавляет рецепт в список избранногопользователя;
-    - shopping_cart() - добавляет рецепт в список покупок пользователя;
+    - shopping_cart() - добавляет рецепт в список покупок пользователя
+      с указанным количеством порций (servings) или изменяет его (PATCH);
+    - favorite_batch(), shopping_cart_batch() - добавляют или удаляют
+      несколько рецептов в списке избранного или покупок одним запросом;
+    - similar() - возвращает рецепты, похожие на данный по ингредиентам
+      и тегам;
+    - changes() - лента изменений рецептов после курсора ?since= для
+      инкрементальной синхронизации клиентских кешей; сами рецепты
+      загружаются списком с параметром ?ids=;
     - download_shopping_cart() - возвращает пользователю текстовый файл
       формата .txt, содержащий список ингредиентов всех рецептов, находящихся
-      у пользователя в списке покупок.
+      у пользователя в списке покупок. При параметре ?async=1 или большом
+      списке покупок файл формируется фоновой задачей, а в ответ
+      возвращается 202 Accepted с её идентификатором.
     """
     queryset = (
         Recipe.objects.all()
@@ -142,18 +311,55 @@ class RecipeViewSet(ModelViewSet):
         )
     )
     permission_classes = (UserStaffOrReadOnly,)
+    lookup_value_regex = r'\d+'
     http_method_names = ('get', 'post', 'patch', 'delete')
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
     pagination_class = LimitPagination
+    values_serializer_class = values_serializers.RecipeValuesSerializer
+    throttle_classes = (AnonRecipeFeedThrottle,)
+    modified_fields = ('updated_at', 'author__updated_at')
+    VIEW_ACTION_NAME = {
+        'favorite': 'избранном',
+        'shopping_cart': 'списке покупок'
+    }
+
+    def get_values_queryset(self, queryset, serializer):
+        columns = serializer.get_columns()
+        flags = [
+            flag for flag in ('is_favorited', 'is_in_shopping_cart')
+            if flag in serializer.selected
+        ]
+        if 'author' in serializer.selected and 'author' in serializer.expanded:
+            columns += [
+                f'author__{column}'
+                for column in values_serializers.UserValuesSerializer.columns
+            ]
+            flags.append('author_is_subscribed')
+        return (
+            utils.annotate_recipe_flags(
+                queryset.select_related(None).prefetch_related(None),
+                self.request.user, flags
+            )
+            .values(*columns, *flags)
+        )
+
+    def prepare_rows(self, rows, serializer):
+        return utils.attach_recipe_relations(
+            rows, serializer.selected, serializer.expanded
+        )
 
     def get_serializer_class(self, *args, **kwargs):
         if self.action == 'get_short_link':
             return serializers.ShortLinkSerializer
-        elif self.action == 'favorite' or self.action == 'shopping_cart':
+        elif self.action in ('favorite', 'shopping_cart', 'similar'):
             return serializers.FavoriteRecipeSerializer
+        elif self.action in ('favorite_batch', 'shopping_cart_batch'):
+            return serializers.RecipeBatchSerializer
         elif self.action == 'download_shopping_cart':
             return serializers.DownloadShoppingCartSerializer
+        elif self.action == 'changes':
+            return serializers.RecipeChangesSerializer
         return serializers.RecipeSerializer
 
     @action(['get'], detail=True, url_path='get-link')
@@ -164,63 +370,271 @@ class RecipeViewSet(ModelViewSet):
     def favorite(self, request, *args, **kwargs):
         return self.post_delete(request, *args, **kwargs)
 
-    @action(['post', 'delete'], detail=True, url_path='shopping_cart')
+    @action(['post', 'patch', 'delete'], detail=True,
+            url_path='shopping_cart')
     def shopping_cart(self, request, *args, **kwargs):
+        if request.method == 'PATCH':
+            servings = serializers.ServingsSerializer(data=request.data)
+            servings.is_valid(raise_exception=True)
+            if not utils.set_servings(
+                request.user, kwargs['pk'],
+                servings.validated_data['servings']
+            ):
+                get_object_or_404(Recipe, pk=kwargs['pk'])
+                raise ValidationError({
+                    api_settings.NON_FIELD_ERRORS_KEY: [
+                        'Данный рецепт не находится в списке покупок'
+                    ]
+                })
+            return Response(servings.validated_data)
         return self.post_delete(request, *args, **kwargs)
 
+    @action(['get'], detail=True, url_path='similar')
+    def similar(self, request, *args, **kwargs):
+        recipe_ids = similarity_index.neighbours(int(kwargs['pk']))
+        if recipe_ids is None:
+            get_object_or_404(Recipe, pk=kwargs['pk'])
+            recipe_ids = []
+        recipes = Recipe.objects.in_bulk(recipe_ids)
+        serializer = self.get_serializer(
+            [recipes[pk] for pk in recipe_ids if pk in recipes],
+            many=True
+        )
+        return Response(serializer.data)
+
+    @action(['get'], detail=False, url_path='changes')
+    def changes(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return Response(utils.get_recipe_changes(
+            serializer.validated_data.get('since'),
+            serializer.validated_data['limit']
+        ))
+
     @action(['get'], detail=False, url_path='download_shopping_cart')
     def download_shopping_cart(self, request, *args, **kwargs):
-        shopping_cart = (
-            request.user.shopping_cart
-            .all()
-            .prefetch_related('composition__ingredient')
-        )
-        ingredients = utils.get_ingredients(shopping_cart)
+        threshold = django_settings.SHOPPING_CART_ASYNC_THRESHOLD
+        if (request.GET.get('async') == '1'
+                or threshold
+                and request.user.shopping_cart.count() > threshold):
+            metrics.SHOPPING_CART_DOWNLOADS.inc('async')
+            task = export_shopping_cart.delay(request.user.id,
+                                              user=request.user)
+            return Response(
+                serializers.TaskSerializer(task).data,
+                status=status.HTTP_202_ACCEPTED,
+                headers={'Location': reverse(
+                    'tasks-detail', args=(task.id,), request=request
+                )}
+            )
+        metrics.SHOPPING_CART_DOWNLOADS.inc('sync')
+        ingredients = utils.get_shopping_list(request.user)
         serializer = self.get_serializer(ingredients, many=True)
         response = HttpResponse(content_type='text/plain')
         response['Content-Disposition'] = (
             'attachment; filename="shopping_cart.txt"'
         )
-        for ingredient in serializer.data:
-            response.write(
-                f"{ingredient['name']}, "
-                f"{ingredient['measurement_unit']} - {ingredient['amount']}\n"
-            )
+        response.write(utils.format_shopping_list(serializer.data))
         return response
 
-    # def get_ingredients(self, queryset):
-    #     ingredients = (
-    #         RecipeComposition.objects
-    #         .filter(recipe__in=queryset)
-    #         .values(
-    #             name=F('ingredient__name'),
-    #             measurement_unit=F('ingredient__measurement_unit')
-    #         )
-    #         .annotate(amount=Sum('amount'))
-    #     )
-    #     return list(ingredients)
+    @action(['post', 'delete'], detail=False, url_path='favorite')
+    def favorite_batch(self, request, *args, **kwargs):
+        return self.post_delete_batch(request, 'favorite')
+
+    @action(['post', 'delete'], detail=False, url_path='shopping_cart')
+    def shopping_cart_batch(self, request, *args, **kwargs):
+        return self.post_delete_batch(request, 'shopping_cart')
+
+    def perform_destroy(self, instance):
+        delete_recipes([instance.id], requested_by=self.request.user)
+
+    def get_cached_response(self, request, get_response, get_etag=None):
+        """Кеширует данные ответа для анонимных пользователей.
+
+        Одновременные запросы одной и той же страницы при промахе кеша
+        выполняют запрос к БД только один раз. Сжатое тело ответа
+        кешируется CompressionMiddleware под тем же ключом. Если передана
+        get_etag, ETag вычисляется при промахе и хранится вместе
+        с данными: попадание в кеш, в том числе условный запрос, не
+        обращается к БД.
+        """
+        if request.user.is_authenticated:
+            return get_response()
+        key = (
+            f'recipes_response:{utils.get_recipes_version()}:'
+            f'{request.build_absolute_uri()}'
+        )
+
+        def compute():
+            # ETag вычисляется раньше данных: изменение между запросами
+            # приведёт к лишней выдаче, а не к 304 с устаревшими данными.
+            etag = get_etag and get_etag()
+            return get_response().data, etag
+
+        data, etag = get_or_compute(key, compute)
+        if etag is not None:
+            not_modified = get_conditional_response(request, etag=etag)
+            if not_modified is not None:
+                return not_modified
+        response = Response(data)
+        response.compressed_cache_key = key
+        if etag is not None:
+            response['ETag'] = etag
+            patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        get_response = partial(super().list, request, *args, **kwargs)
+        if self.action != 'list':
+            return get_response()
+        if not request.user.is_authenticated:
+            # Агрегат по всей ленте вычисляется только при промахе кеша.
+            return self.get_cached_response(
+                request, get_response,
+                lambda: self.get_etag(self.get_list_validators())
+            )
+        return self.conditional_response(
+            self.get_list_validators(), get_response, last_modified=False
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        get_response = partial(super().retrieve, request, *args, **kwargs)
+        if self.action != 'retrieve':
+            return get_response()
+        if self.is_sparse():
+            get_response = self.retrieve_values
+        return self.conditional_response(
+            self.get_object_validators(),
+            partial(self.get_cached_response, request, get_response)
+        )
 
     def post_delete(self, request, *args, **kwargs):
-        recipe = get_object_or_404(Recipe, pk=kwargs['pk'])
-        serializer = self.get_serializer(recipe, data=request.data)
-        serializer.is_valid(raise_exception=True)
         if request.method == 'POST':
-            if self.action == 'favorite':
-                request.user.favorites.add(recipe)
-            elif self.action == 'shopping_cart':
-                request.user.shopping_cart.add(recipe)
+            recipe = get_object_or_404(
+                Recipe.objects.only('id', 'name', 'image', 'cooking_time'),
+                pk=kwargs['pk']
+            )
+            extra = {}
+            if self.action == 'shopping_cart':
+                servings = serializers.ServingsSerializer(data=request.data)
+                servings.is_valid(raise_exception=True)
+                extra = servings.validated_data
+            if not utils.add_to_list(
+                self.action, request.user, [recipe.id], **extra
+            ):
+                raise ValidationError({
+                    api_settings.NON_FIELD_ERRORS_KEY: [
+                        'Данный рецепт уже находится в '
+                        f'{self.VIEW_ACTION_NAME[self.action]}'
+                    ]
+                })
+            serializer = self.get_serializer(recipe)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         elif request.method == 'DELETE':
-            if self.action == 'favorite':
-                request.user.favorites.remove(recipe)
-            elif self.action == 'shopping_cart':
-                request.user.shopping_cart.remove(recipe)
+            if not utils.remove_from_list(
+                self.action, request.user, [kwargs['pk']]
+            ):
+                get_object_or_404(Recipe, pk=kwargs['pk'])
+                raise ValidationError({
+                    api_settings.NON_FIELD_ERRORS_KEY: [
+                        'Данный рецепт не находится в '
+                        f'{self.VIEW_ACTION_NAME[self.action]}'
+                    ]
+                })
             return Response(status=status.HTTP_204_NO_CONTENT)
 
+    def post_delete_batch(self, request, list_name):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = serializer.validated_data['recipes']
+        if request.method == 'POST':
+            count = utils.add_to_list(list_name, request.user, recipe_ids)
+        elif request.method == 'DELETE':
+            count = utils.remove_from_list(
+                list_name, request.user, recipe_ids
+            )
+        return Response({'count': count}, status=status.HTTP_200_OK)
+
+
+class TaskViewSet(RetrieveModelMixin, GenericViewSet):
+    """
+    ViewSet для просмотра статуса фоновых задач пользователя.
+
+    - result() - возвращает результат выполненной задачи; если задача
+      формирует файл, он отдаётся как вложение.
+    """
+    serializer_class = serializers.TaskSerializer
+    permission_classes = (IsAuthenticated,)
+
+    def get_queryset(self):
+        if self.request.user.is_staff:
+            return Task.objects.all()
+        return Task.objects.filter(user=self.request.user)
+
+    @action(['get'], detail=True, url_path='result')
+    def result(self, request, *args, **kwargs):
+        task = self.get_object()
+        if task.status in (Task.PENDING, Task.RUNNING):
+            return Response(
+                self.get_serializer(task).data,
+                status=status.HTTP_202_ACCEPTED
+            )
+        if task.status == Task.FAILED:
+            return Response(
+                self.get_serializer(task).data,
+                status=status.HTTP_409_CONFLICT
+            )
+        if isinstance(task.result, dict) and 'content' in task.result:
+            response = HttpResponse(
+                task.result['content'],
+                content_type=task.result.get('content_type', 'text/plain')
+            )
+            response['Content-Disposition'] = (
+                f'attachment; filename="{task.result["filename"]}"'
+            )
+            return response
+        return Response(task.result)
+
 
 @api_view(['GET'])
+@throttle_classes((ShortLinkThrottle,))
 def short_link_redirect(request, link):
     """Редирект на рецепт, соответствующий короткой ссылке"""
-    recipe = get_object_or_404(Recipe, short_link=link)
-    url = f'{request.scheme}://{request.get_host()}/recipes/{recipe.id}'
+    metrics.SHORT_LINK_HITS.inc()
+    # Несуществующие ссылки кешируются как 0, чтобы перебор ссылок
+    # не доходил до БД.
+    recipe_id = get_or_compute(
+        utils.SHORT_LINK_CACHE_KEY.format(link),
+        lambda: Recipe.objects.filter(short_link=link).values_list(
+            'id', flat=True
+        ).first() or 0
+    )
+    if not recipe_id:
+        raise Http404
+    url = f'{request.scheme}://{request.get_host()}/recipes/{recipe_id}'
     return redirect(url)
+
+
+def is_metrics_client(request):
+    """Доступны ли метрики: сотрудникам и клиентам из сетей
+    METRICS_ALLOWED_NETWORKS."""
+    if request.user.is_staff:
+        return True
+    try:
+        address = ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return False
+    return any(
+        address in ip_network(network.strip(), strict=False)
+        for network in django_settings.METRICS_ALLOWED_NETWORKS
+    )
+
+
+def metrics_view(request):
+    """Метрики в текстовом формате Prometheus"""
+    if not is_metrics_client(request):
+        raise PermissionDenied
+    return HttpResponse(
+        metrics.registry.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
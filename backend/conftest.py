@@ -0,0 +1,19 @@
+import pytest
+from django.core.cache import cache
+
+from recipes.models import User
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture
+def user(db):
+    return User.objects.create_user(
+        username='user', email='user@example.com', password='password',
+        first_name='Имя', last_name='Фамилия'
+    )
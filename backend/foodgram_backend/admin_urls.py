@@ -0,0 +1,20 @@
+"""URL админки.
+
+Модуль подключается из foodgram_backend.urls лениво, поэтому модули
+admin.py приложений загружаются при первом обращении к админке или
+первом вызове reverse(), а не при запуске воркера.
+"""
+from django.contrib import admin
+from django.urls import path
+
+from api.admin_views import profile_view, profiles_view
+
+admin.autodiscover()
+
+urlpatterns = [
+    path('profiles/', admin.site.admin_view(profiles_view),
+         name='profiles'),
+    path('profiles/<str:profile_id>/',
+         admin.site.admin_view(profile_view), name='profile'),
+    path('', admin.site.urls),
+]
@@ -11,7 +11,9 @@ DEBUG = (os.getenv('DEBUG', 'False').lower() == 'true')
 ALLOWED_HOSTS = ['127.0.0.1', 'localhost', '51.250.16.100', 'yp-ageev.servehttp.com']
 
 INSTALLED_APPS = [
-    'django.contrib.admin',
+    # Без автоматического поиска admin.py: его выполняет
+    # foodgram_backend.admin_urls при первом обращении к админке.
+    'django.contrib.admin.apps.SimpleAdminConfig',
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
@@ -23,9 +25,14 @@ INSTALLED_APPS = [
     'djoser',
     'api',
     'recipes',
+    'tasks',
 ]
 
 MIDDLEWARE = [
+    'api.middleware.ProfilerMiddleware',
+    'api.middleware.MetricsMiddleware',
+    'api.middleware.CompressionMiddleware',
+    'api.middleware.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -70,6 +77,22 @@ DATABASES = {
     }
 }
 
+# Read replicas: comma-separated hosts sharing the primary's credentials.
+DATABASE_REPLICAS = []
+for number, host in enumerate(filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(',')), 1):
+    alias = f'replica_{number}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': host.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['api.db_router.ReplicaRouter']
+
+REPLICA_STICKINESS_TIMEOUT = int(os.getenv('REPLICA_STICKINESS_TIMEOUT', 5))
+REPLICA_RETRY_INTERVAL = 30
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -113,6 +136,11 @@ STATIC_ROOT = BASE_DIR / 'collected_static'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = '/foodgram_media'
 
+DEFAULT_FILE_STORAGE = 'recipes.storage.ContentAddressedStorage'
+# Файлы, изменённые позже, не удаляются сразу при освобождении: на них
+# может ссылаться ещё не зафиксированная транзакция. Их удаляет gcmedia.
+MEDIA_DELETE_GRACE_PERIOD = 60
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -127,8 +155,87 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.AllowAny',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'api.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_THROTTLE_RATES': {
+        'short_link': os.getenv('THROTTLE_SHORT_LINK', '120/min'),
+        'anon_recipe_feed': os.getenv('THROTTLE_ANON_RECIPE_FEED', '60/min'),
+        'ingredient_search': os.getenv('THROTTLE_INGREDIENT_SEARCH', '300/min'),
+    },
+    # nginx добавляет адрес клиента в X-Forwarded-For.
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', 1)),
+}
+
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
 }
 
+# Metrics
+
+METRICS_DIR = os.getenv('METRICS_DIR')
+METRICS_FLUSH_INTERVAL = 5
+# Сети, из которых доступен /metrics, через запятую. Адрес клиента
+# берётся из REMOTE_ADDR: nginx не проксирует /metrics, поэтому
+# X-Forwarded-For не учитывается. Сотрудникам /metrics доступен всегда.
+METRICS_ALLOWED_NETWORKS = list(filter(None, os.getenv('METRICS_ALLOWED_NETWORKS', '127.0.0.0/8,::1/128').split(',')))
+
+# Профилирование запросов: интервал выборки стека в секундах, доля
+# профилируемых запросов (0 - только ?_profile= для сотрудников)
+# и число хранимых последних профилей.
+PROFILER_INTERVAL = 0.005
+PROFILER_SAMPLE_RATE = float(os.getenv('PROFILER_SAMPLE_RATE', 0))
+PROFILER_RING_SIZE = 50
+PROFILER_CACHE_TIMEOUT = 60 * 60 * 24
+
+RESPONSE_CACHE_TIMEOUT = 30
+COMPRESSION_MIN_SIZE = 512
+COALESCING_LOCK_TIMEOUT = 5
+
+SUBSCRIPTION_RECIPES_LIMIT = 3
+
+USER_SEARCH_MAX_WORDS = 3
+
+# Максимальное число рецептов в ?ids= и записей в одной странице ленты
+# изменений. Записи журнала моложе RECIPE_CHANGES_DELAY секунд
+# не выдаются, чтобы курсор не пропустил записи транзакций,
+# зафиксированных позже.
+RECIPE_IDS_LIMIT = 100
+RECIPE_CHANGES_LIMIT = 1000
+RECIPE_CHANGES_DELAY = 2
+
+SHOPPING_LIST_CACHE_TIMEOUT = 60 * 60
+
+SHOPPING_CART_ASYNC_THRESHOLD = int(
+    os.getenv('SHOPPING_CART_ASYNC_THRESHOLD', 0)
+)
+
+# Фоновые задачи. BACKEND: database (выполняет отдельный процесс
+# manage.py runtasks, сервис tasks в docker-compose), thread, process
+# или immediate (синхронно, для тестов). При thread и process задачи,
+# не завершённые к перезапуску воркера, остаются в статусе pending
+# или running, пока их не подхватит runtasks.
+TASKS = {
+    'BACKEND': os.getenv('TASKS_BACKEND', 'database'),
+    'CONCURRENCY': int(os.getenv('TASKS_CONCURRENCY', 2)),
+    'MAX_RETRIES': 3,
+}
+
+# Размер пачки при фоновом удалении пользователей и рецептов.
+DELETION_BATCH_SIZE = 500
+
+SIMILAR_RECIPES_LIMIT = 6
+SIMILAR_RECIPES_REBUILD_INTERVAL = int(
+    os.getenv('SIMILAR_RECIPES_REBUILD_INTERVAL', 600)
+)
+
 DJOSER = {
     'LOGIN_FIELD': 'email',
     'HIDE_USERS': False,
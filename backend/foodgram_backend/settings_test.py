@@ -0,0 +1,34 @@
+# flake8: noqa
+import tempfile
+
+from .settings import *
+
+ALLOWED_HOSTS = ['*']
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    },
+    # Реплика для тестов маршрутизации, в тестах зеркалирует default.
+    'replica_1': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+DATABASE_REPLICAS = []
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+MEDIA_ROOT = tempfile.mkdtemp(prefix='foodgram_media_')
+
+METRICS_DIR = None
+
+TASKS = {**TASKS, 'BACKEND': 'immediate'}
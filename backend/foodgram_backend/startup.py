@@ -0,0 +1,35 @@
+"""Ускорение запуска воркеров.
+
+Быстрый режим запуска (FAST_STARTUP) отключает импорт необязательных
+модулей, которые сторонние пакеты подгружают «на всякий случай», и
+заранее загружает конфигурацию URL, чтобы при запуске gunicorn с
+--preload вся эта работа выполнялась один раз в мастер-процессе и
+разделялась воркерами через copy-on-write.
+"""
+import os
+import sys
+
+# coreapi и coreschema устанавливаются как зависимости djoser, но
+# нужны только для схем coreapi, которые в проекте не подключены. DRF
+# и django-filter импортируют эти модули через try/except ImportError,
+# поэтому запрет импорта безопасен. Модули, которые может использовать
+# код проекта или сторонних пакетов (например, requests), сюда
+# не входят.
+UNUSED_MODULES = ('coreapi', 'coreschema')
+
+
+def is_enabled():
+    return os.getenv('FAST_STARTUP', 'True').lower() == 'true'
+
+
+def disable_unused_modules():
+    """Запрещает импорт неиспользуемых модулей."""
+    for name in UNUSED_MODULES:
+        sys.modules.setdefault(name, None)
+
+
+def warm_up():
+    """Загружает конфигурацию URL и все импортируемые ею модули."""
+    from django.urls import get_resolver
+
+    get_resolver().url_patterns
@@ -1,13 +1,16 @@
 from django.conf import settings
 from django.conf.urls.static import static
-from django.contrib import admin
-from django.urls import path, include
+from django.urls import URLResolver, include, path
+from django.urls.resolvers import RoutePattern
 
-from api.views import short_link_redirect
+from api.views import metrics_view, short_link_redirect
 
 urlpatterns = [
     path('s/<str:link>/', short_link_redirect),
-    path('admin/', admin.site.urls),
+    path('metrics', metrics_view),
+    # В отличие от include(), URLResolver с именем модуля импортирует
+    # его только при первом обращении к url_patterns.
+    URLResolver(RoutePattern('admin/'), 'foodgram_backend.admin_urls'),
     path('api/', include('api.urls')),
 ]
 
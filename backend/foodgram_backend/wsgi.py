@@ -11,6 +11,14 @@ import os
 
 from django.core.wsgi import get_wsgi_application
 
+from foodgram_backend import startup
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram_backend.settings')
 
+if startup.is_enabled():
+    startup.disable_unused_modules()
+
 application = get_wsgi_application()
+
+if startup.is_enabled():
+    startup.warm_up()
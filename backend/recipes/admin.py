@@ -1,15 +1,72 @@
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import IsNull
+from django.utils.functional import cached_property
+
+from api.utils import bump_recipes_version, invalidate_recipe_shopping_lists
 
 from . import models
+from .deletion import delete_recipes, delete_user
+
+TAG_FILTER_LIMIT = 30
+ESTIMATED_COUNT_THRESHOLD = 10000
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор, который для нефильтрованного списка в PostgreSQL
+    берёт оценку числа строк из статистики pg_class вместо COUNT(*).
+
+    Оценка используется, только если она больше
+    ESTIMATED_COUNT_THRESHOLD, иначе выполняется точный подсчёт.
+    """
+
+    @staticmethod
+    def is_unfiltered(queryset):
+        """Запрос не отфильтрован ничем, кроме условия deleted_at IS
+        NULL, которым менеджер скрывает помеченные на удаление записи.
+        Таких записей мало, поэтому оценка остаётся точной."""
+        return all(
+            isinstance(child, IsNull) and child.rhs is True
+            and child.lhs.target.name == 'deleted_at'
+            for child in queryset.query.where.children
+        )
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if self.is_unfiltered(queryset) and connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples FROM pg_class WHERE relname = %s',
+                    (queryset.model._meta.db_table,)
+                )
+                row = cursor.fetchone()
+            if row and row[0] > ESTIMATED_COUNT_THRESHOLD:
+                return int(row[0])
+        return super().count
 
 
 class TagFilter(admin.SimpleListFilter):
+    """Фильтр по тегам, показывающий не больше TAG_FILTER_LIMIT тегов
+    и всегда - выбранный."""
     title = 'Теги'
     parameter_name = 'tag'
 
     def lookups(self, request, model_admin):
-        tags = models.Tag.objects.all()
-        return [(tag.slug, tag.name) for tag in tags]
+        tags = list(
+            models.Tag.objects.order_by('name')
+            .values_list('slug', 'name')[:TAG_FILTER_LIMIT]
+        )
+        selected = self.value()
+        if selected and selected not in dict(tags):
+            tags += models.Tag.objects.filter(
+                slug=selected
+            ).values_list('slug', 'name')
+        return tags
 
     def queryset(self, request, queryset):
         tag_slug = self.value()
@@ -23,39 +80,120 @@ class RecipeCompositionInline(admin.TabularInline):
     extra = 0
     min_num = 1
     verbose_name = 'ингредиент'
+    autocomplete_fields = ('ingredient',)
 
 
 class SubscribtionsInline(admin.TabularInline):
     model = models.Subscribtions
     fk_name = 'user'
     extra = 1
+    autocomplete_fields = ('subscriber',)
     verbose_name = 'Подписчик'
     verbose_name_plural = 'Подписчики'
 
 
-class UserAdmin(admin.ModelAdmin):
+class BackgroundDeletionMixin:
+    """Удаление через фоновую задачу.
+
+    Объекты только помечаются на удаление и сразу пропадают из списков,
+    связанные записи удаляются пачками в фоне. Страница подтверждения
+    не собирает все каскадно удаляемые объекты.
+    """
+
+    def get_deleted_objects(self, objs, request):
+        objs = list(objs)
+        return (
+            [str(obj) for obj in objs],
+            {self.model._meta.verbose_name_plural: len(objs)},
+            set(),
+            []
+        )
+
+
+class UserAdmin(BackgroundDeletionMixin, admin.ModelAdmin):
     search_fields = ('email', 'username')
+    autocomplete_fields = ('favorites',)
     inlines = (SubscribtionsInline,)
 
+    def delete_model(self, request, obj):
+        delete_user(obj, requested_by=request.user)
 
-class RecipeAdmin(admin.ModelAdmin):
+    def delete_queryset(self, request, queryset):
+        for user in queryset:
+            delete_user(user, requested_by=request.user)
+
+
+class RecipeAdmin(BackgroundDeletionMixin, admin.ModelAdmin):
     list_display = ('name', 'author', 'favorited_count')
-    search_fields = ('author', 'name')
+    list_select_related = ('author',)
+    search_fields = ('^name',)
     list_filter = (TagFilter,)
+    autocomplete_fields = ('author', 'tags')
     inlines = (RecipeCompositionInline,)
     readonly_fields = ('favorited_count',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        favorited = (
+            models.User.favorites.through.objects
+            .filter(recipe=OuterRef('pk'))
+            .order_by()
+            .values('recipe')
+            .annotate(count=Count('*'))
+            .values('count')
+        )
+        return super().get_queryset(request).annotate(
+            favorited=Coalesce(Subquery(favorited), 0)
+        )
+
+    def get_search_results(self, request, queryset, search_term):
+        """Ищет по началу названия и по точному совпадению логина или
+        почты автора, чтобы поиск использовал индексы."""
+        result, may_have_duplicates = super().get_search_results(
+            request, queryset, search_term
+        )
+        search_term = search_term.strip()
+        if search_term:
+            authors = models.User.objects.filter(
+                Q(username=search_term) | Q(email=search_term)
+            ).values('id')
+            result |= queryset.filter(author__in=authors)
+        return result, may_have_duplicates
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        form.instance.refresh_summary()
+        invalidate_recipe_shopping_lists([form.instance.id])
+        bump_recipes_version()
+
+    def delete_model(self, request, obj):
+        delete_recipes([obj.pk], requested_by=request.user)
+
+    def delete_queryset(self, request, queryset):
+        delete_recipes(
+            list(queryset.values_list('pk', flat=True)),
+            requested_by=request.user
+        )
 
     def favorited_count(self, obj):
-        return obj.user_set.count()
+        return obj.favorited
     favorited_count.short_description = 'В избранном'
+    favorited_count.admin_order_field = 'favorited'
+
+
+class TagAdmin(admin.ModelAdmin):
+    list_display = ('name', 'slug')
+    search_fields = ('^name',)
 
 
 class IngredientAdmin(admin.ModelAdmin):
     list_display = ('name', 'measurement_unit')
-    search_fields = ('name',)
+    search_fields = ('^name',)
+    ordering = ('name',)
 
 
 admin.site.register(models.User, UserAdmin)
 admin.site.register(models.Recipe, RecipeAdmin)
-admin.site.register(models.Tag)
+admin.site.register(models.Tag, TagAdmin)
 admin.site.register(models.Ingredient, IngredientAdmin)
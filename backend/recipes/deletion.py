@@ -0,0 +1,146 @@
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from api.utils import bump_recipes_version, invalidate_recipe_shopping_lists
+from tasks.registry import task
+from tasks.runner import report_progress
+
+from .models import (Recipe, RecipeChange, RecipeComposition, ShoppingCart,
+                     Subscribtions, User)
+
+# Записи, удаляемые до самих рецептов и пользователей: (модель, поле
+# внешнего ключа).
+RECIPE_DEPENDENTS = (
+    (RecipeComposition, 'recipe'),
+    (Recipe.tags.through, 'recipe'),
+    (User.favorites.through, 'recipe'),
+    (ShoppingCart, 'recipe'),
+)
+USER_DEPENDENTS = (
+    (Subscribtions, 'user'),
+    (Subscribtions, 'subscriber'),
+    (User.favorites.through, 'user'),
+    (ShoppingCart, 'user'),
+)
+
+
+def delete_recipes(recipe_ids, requested_by=None):
+    """Помечает рецепты на удаление и ставит в очередь их удаление.
+
+    Рецепты сразу пропадают из всех запросов через Recipe.objects,
+    а лента изменений получает надгробия. Возвращает Task фоновой
+    задачи или None, если удалять нечего.
+    """
+    recipe_ids = list(
+        Recipe.objects.filter(pk__in=recipe_ids).values_list('pk', flat=True)
+    )
+    if not recipe_ids:
+        return None
+    with transaction.atomic():
+        Recipe.objects.filter(pk__in=recipe_ids).update(
+            deleted_at=timezone.now()
+        )
+        RecipeChange.record(recipe_ids, RecipeChange.DELETED)
+        invalidate_recipe_shopping_lists(recipe_ids)
+        transaction.on_commit(bump_recipes_version)
+        return purge_recipes.delay(recipe_ids, user=requested_by)
+
+
+def delete_user(user, requested_by=None):
+    """Помечает пользователя и его рецепты на удаление и ставит
+    в очередь их удаление.
+
+    Пользователь деактивируется, а его почта и логин освобождаются
+    сразу, чтобы их можно было использовать для новой регистрации.
+    Возвращает Task фоновой задачи.
+    """
+    if requested_by is not None and requested_by.pk == user.pk:
+        # Задачи пользователя удаляются вместе с ним.
+        requested_by = None
+    with transaction.atomic():
+        User.objects.filter(pk=user.pk).update(
+            deleted_at=timezone.now(),
+            is_active=False,
+            email=f'{user.pk}@deleted.invalid',
+            username=f'deleted-{user.pk}'
+        )
+        recipes = Recipe.objects.filter(author_id=user.pk)
+        recipe_ids = list(recipes.values_list('pk', flat=True))
+        recipes.update(deleted_at=timezone.now())
+        RecipeChange.record(recipe_ids, RecipeChange.DELETED)
+        invalidate_recipe_shopping_lists(recipe_ids)
+        transaction.on_commit(bump_recipes_version)
+        return purge_user.delay(user.pk, user=requested_by)
+
+
+def delete_in_batches(queryset, progress):
+    """Удаляет записи запроса пачками по DELETION_BATCH_SIZE, каждую
+    в отдельной транзакции, и учитывает их в progress."""
+    model = queryset.model
+    label = model._meta.label
+    while True:
+        pks = list(
+            queryset.values_list('pk', flat=True)
+            [:settings.DELETION_BATCH_SIZE]
+        )
+        if not pks:
+            return
+        with transaction.atomic():
+            model._base_manager.filter(pk__in=pks).delete()
+        progress[label] = progress.get(label, 0) + len(pks)
+        report_progress(progress)
+
+
+def purge_recipe_batch(recipe_ids, progress):
+    for model, field in RECIPE_DEPENDENTS:
+        delete_in_batches(
+            model.objects.filter(**{f'{field}_id__in': recipe_ids}), progress
+        )
+    delete_in_batches(
+        Recipe.all_objects.filter(
+            pk__in=recipe_ids, deleted_at__isnull=False
+        ),
+        progress
+    )
+
+
+@task(name='purge_recipes')
+def purge_recipes(recipe_ids):
+    """Удаляет помеченные рецепты и связанные с ними записи пачками.
+
+    Файлы изображений освобождаются сигналом post_delete. Повторный
+    запуск продолжает удаление с места остановки.
+    """
+    progress = {}
+    for start in range(0, len(recipe_ids), settings.DELETION_BATCH_SIZE):
+        purge_recipe_batch(
+            recipe_ids[start:start + settings.DELETION_BATCH_SIZE], progress
+        )
+    return progress
+
+
+@task(name='purge_user')
+def purge_user(user_id):
+    """Удаляет помеченного пользователя: сначала его рецепты, затем
+    подписки, избранное и список покупок, затем саму запись."""
+    progress = {}
+    recipes = (
+        Recipe.all_objects.filter(author_id=user_id, deleted_at__isnull=False)
+        .order_by('pk')
+        .values_list('pk', flat=True)
+    )
+    while True:
+        recipe_ids = list(recipes[:settings.DELETION_BATCH_SIZE])
+        if not recipe_ids:
+            break
+        purge_recipe_batch(recipe_ids, progress)
+    for model, field in USER_DEPENDENTS:
+        delete_in_batches(
+            model.objects.filter(**{f'{field}_id': user_id}), progress
+        )
+    delete_in_batches(
+        User.all_objects.filter(pk=user_id, deleted_at__isnull=False),
+        progress
+    )
+    return progress
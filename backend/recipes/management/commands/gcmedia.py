@@ -0,0 +1,158 @@
+import hashlib
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.storage import ContentAddressedStorage
+
+
+def name_hash(name):
+    """64-битный хеш имени файла. Совпадение хешей разных имён приводит
+    лишь к тому, что файл не будет удалён."""
+    return int.from_bytes(
+        hashlib.blake2b(name.encode(), digest_size=8).digest(), 'big'
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет медиафайлы, на которые не ссылается ни одна запись'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только подсчитать неиспользуемые файлы'
+        )
+        parser.add_argument(
+            '--rate',
+            type=float,
+            default=0,
+            help='Максимум удалений в секунду, 0 - без ограничения'
+        )
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=60 * 60,
+            help=(
+                'Не трогать файлы, изменённые менее указанного числа '
+                'секунд назад'
+            )
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Количество потоков обхода каталогов'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Количество записей, получаемых из БД за один раз'
+        )
+
+    def get_references(self, chunk_size):
+        """Хеши имён всех файлов, на которые ссылаются записи, включая
+        помеченные на удаление."""
+        references = set()
+        for field in default_storage.get_file_fields():
+            names = (
+                field.model._base_manager
+                .exclude(**{f'{field.name}__isnull': True})
+                .exclude(**{field.name: ''})
+                .values_list(field.name, flat=True)
+                .iterator(chunk_size=chunk_size)
+            )
+            references.update(map(name_hash, names))
+        return references
+
+    def get_directories(self):
+        """Каталоги для обхода: каталоги upload_to полей и их
+        подкаталоги, чтобы их можно было обходить параллельно."""
+        directories = []
+        for field in default_storage.get_file_fields():
+            directory = os.path.normpath(str(field.upload_to))
+            if directory in directories:
+                continue
+            directories.append(directory)
+            if not os.path.isdir(default_storage.path(directory)):
+                continue
+            with os.scandir(default_storage.path(directory)) as entries:
+                directories.extend(
+                    f'{directory}/{entry.name}' for entry in entries
+                    if entry.is_dir(follow_symlinks=False)
+                )
+        return directories
+
+    def scan(self, directory, references, max_mtime):
+        """Возвращает число файлов каталога и список неиспользуемых
+        файлов (имя, размер), включая оставшиеся после сбоев временные
+        файлы .upload-* и .delete-*. Подкаталоги не обходятся: для них
+        get_directories() создаёт отдельные задания."""
+        scanned = 0
+        orphans = []
+        try:
+            entries = os.scandir(default_storage.path(directory))
+        except FileNotFoundError:
+            return scanned, orphans
+        with entries:
+            for entry in entries:
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                scanned += 1
+                name = f'{directory}/{entry.name}'
+                if name_hash(name) in references:
+                    continue
+                stat = entry.stat(follow_symlinks=False)
+                if stat.st_mtime <= max_mtime:
+                    orphans.append((name, stat.st_size))
+        return scanned, orphans
+
+    def handle(self, *args, **options):
+        if not isinstance(default_storage, ContentAddressedStorage):
+            raise CommandError(
+                'DEFAULT_FILE_STORAGE должен быть ContentAddressedStorage'
+            )
+        references = self.get_references(options['chunk_size'])
+        max_mtime = time.time() - options['min_age']
+        interval = 1 / options['rate'] if options['rate'] else 0
+        scanned = found = deleted = freed = 0
+        next_delete = time.monotonic()
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            results = executor.map(
+                lambda directory: self.scan(
+                    directory, references, max_mtime
+                ),
+                self.get_directories()
+            )
+            for count, orphans in results:
+                scanned += count
+                found += len(orphans)
+                if options['dry_run']:
+                    freed += sum(size for name, size in orphans)
+                    continue
+                for name, size in orphans:
+                    delay = next_delete - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                    next_delete = max(next_delete, time.monotonic()) + interval
+                    # Файл мог получить ссылку после чтения ссылок из БД,
+                    # поэтому перед удалением ссылки проверяются заново.
+                    if default_storage.delete_unreferenced(name):
+                        deleted += 1
+                        freed += size
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(
+                f'Просмотрено файлов: {scanned}, неиспользуемых: {found} '
+                f'({freed} байт)'
+            ))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'Просмотрено файлов: {scanned}, удалено: {deleted} '
+            f'({freed} байт)'
+        ))
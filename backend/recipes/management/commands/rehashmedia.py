@@ -0,0 +1,92 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from api.utils import bump_recipes_version
+from recipes.models import Recipe, RecipeChange
+from recipes.storage import ContentAddressedStorage
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит существующие медиафайлы в хранилище с именами '
+        'по хешу содержимого'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Количество записей, обрабатываемых за один запрос'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только подсчитать файлы, которые нужно перенести'
+        )
+
+    def rehash_batch(self, field, rows, dry_run):
+        """Переносит файлы пачки записей и возвращает число
+        перенесённых файлов."""
+        model = field.model
+        renamed = {}
+        for pk, name in rows:
+            if default_storage.is_content_addressed(name):
+                continue
+            if name not in renamed:
+                if not default_storage.exists(name):
+                    self.stderr.write(
+                        f'{model.__name__} {pk}: файл {name} не найден'
+                    )
+                    renamed[name] = None
+                    continue
+                if dry_run:
+                    renamed[name] = name
+                    continue
+                with default_storage.open(name) as file:
+                    renamed[name] = default_storage.save(name, file)
+            if renamed[name] and not dry_run:
+                updated = model._default_manager.filter(
+                    pk=pk, **{field.name: name}
+                ).update(
+                    **{field.name: renamed[name]}, updated_at=timezone.now()
+                )
+                if updated and model is Recipe:
+                    RecipeChange.record((pk,), RecipeChange.UPDATED)
+        if not dry_run:
+            # Файл, на который ссылаются ещё не обработанные записи,
+            # останется на месте и будет удалён вместе с последней из них.
+            for name, new_name in renamed.items():
+                if new_name:
+                    default_storage.delete_unreferenced(name)
+        return sum(bool(new_name) for new_name in renamed.values())
+
+    def handle(self, *args, **options):
+        if not isinstance(default_storage, ContentAddressedStorage):
+            raise CommandError(
+                'DEFAULT_FILE_STORAGE должен быть ContentAddressedStorage'
+            )
+        total = 0
+        for field in default_storage.get_file_fields():
+            queryset = (
+                field.model._default_manager
+                .exclude(**{f'{field.name}__isnull': True})
+                .exclude(**{field.name: ''})
+                .order_by('pk')
+                .values_list('pk', field.name)
+            )
+            last_pk = None
+            while True:
+                batch = queryset
+                if last_pk is not None:
+                    batch = batch.filter(pk__gt=last_pk)
+                rows = list(batch[:options['batch_size']])
+                if not rows:
+                    break
+                last_pk = rows[-1][0]
+                total += self.rehash_batch(field, rows, options['dry_run'])
+                if not options['dry_run']:
+                    bump_recipes_version()
+        action = 'Нужно перенести' if options['dry_run'] else 'Перенесено'
+        self.stdout.write(self.style.SUCCESS(f'{action} файлов: {total}'))
@@ -0,0 +1,32 @@
+# Generated by Django 3.2.3 on 2026-10-19 02:12
+
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def remove_duplicate_subscriptions(apps, schema_editor):
+    Subscribtions = apps.get_model('recipes', 'Subscribtions')
+    keep_ids = (
+        Subscribtions.objects
+        .values('user', 'subscriber')
+        .annotate(keep_id=Min('id'))
+        .values('keep_id')
+    )
+    Subscribtions.objects.exclude(id__in=keep_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_auto_20241009_0717'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            remove_duplicate_subscriptions, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='subscribtions',
+            constraint=models.UniqueConstraint(fields=('user', 'subscriber'), name='unique_subscription'),
+        ),
+    ]
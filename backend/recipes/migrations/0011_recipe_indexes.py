@@ -0,0 +1,58 @@
+# Generated by Django 3.2.3 on 2026-10-19 02:16
+
+from django.db import migrations, models
+
+RECIPE_LIST_INDEXES = (
+    ('recipes_user_favorites', 'user_favorites_recipe_user_idx'),
+    ('recipes_user_shopping_cart', 'user_shopping_cart_recipe_user_idx'),
+)
+
+
+def create_ingredient_search_index(apps, schema_editor):
+    # istartswith в PostgreSQL выполняется как UPPER(name::text) LIKE ...,
+    # поэтому для поиска по началу названия нужен функциональный индекс.
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX ingredient_name_upper_like_idx '
+            'ON recipes_ingredient (UPPER(name::text) text_pattern_ops)'
+        )
+
+
+def drop_ingredient_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX ingredient_name_upper_like_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_subscribtions_unique_subscription'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='short_link',
+            field=models.CharField(db_index=True, max_length=32, verbose_name='Короткая ссылка'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-pub_date'], name='recipe_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-pub_date'], name='recipe_author_pub_date_idx'),
+        ),
+        migrations.RunSQL(
+            sql=[
+                f'CREATE INDEX {index} ON {table} (recipe_id, user_id)'
+                for table, index in RECIPE_LIST_INDEXES
+            ],
+            reverse_sql=[
+                f'DROP INDEX {index}' for _, index in RECIPE_LIST_INDEXES
+            ],
+        ),
+        migrations.RunPython(
+            create_ingredient_search_index, drop_ingredient_search_index
+        ),
+    ]
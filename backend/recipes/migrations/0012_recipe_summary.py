@@ -0,0 +1,46 @@
+# Generated by Django 3.2.3 on 2026-10-19 02:20
+
+from django.db import migrations, models
+
+
+def fill_summary(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeComposition = apps.get_model('recipes', 'RecipeComposition')
+    for recipe in Recipe.objects.only('id').iterator():
+        unit_totals = {}
+        ingredient_ids = []
+        amounts = []
+        compositions = (
+            RecipeComposition.objects
+            .filter(recipe=recipe)
+            .order_by('id')
+            .values_list('ingredient_id', 'ingredient__measurement_unit',
+                         'amount')
+        )
+        for ingredient_id, unit, amount in compositions:
+            unit_totals[unit] = unit_totals.get(unit, 0) + amount
+            ingredient_ids.append(ingredient_id)
+            amounts.append(amount)
+        recipe.summary = {
+            'ingredients_count': len(ingredient_ids),
+            'unit_totals': dict(sorted(unit_totals.items())),
+            'ingredient_ids': ingredient_ids,
+            'amounts': amounts,
+        }
+        recipe.save(update_fields=('summary',))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_recipe_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='summary',
+            field=models.JSONField(blank=True, default=dict, verbose_name='Сводка по составу'),
+        ),
+        migrations.RunPython(fill_summary, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 3.2.3 on 2026-10-19 02:31
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_recipe_summary'),
+    ]
+
+    operations = [
+        # Промежуточная таблица списка покупок уже существует: модель
+        # ShoppingCart только описывает её, а в БД добавляется лишь
+        # столбец servings.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='ShoppingCart',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='recipes.recipe', verbose_name='Рецепт')),
+                        ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                    ],
+                    options={
+                        'verbose_name': 'Рецепт в списке покупок',
+                        'verbose_name_plural': 'Список покупок',
+                        'db_table': 'recipes_user_shopping_cart',
+                        'unique_together': {('user', 'recipe')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='user',
+                    name='shopping_cart',
+                    field=models.ManyToManyField(related_name='in_shopping_cart', through='recipes.ShoppingCart', to='recipes.Recipe', verbose_name='Список покупок'),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='shoppingcart',
+            name='servings',
+            field=models.PositiveSmallIntegerField(default=1, verbose_name='Количество порций'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+from django.db import migrations
+
+
+def create_recipe_search_index(apps, schema_editor):
+    # Поиск в админке по началу названия (istartswith) выполняется как
+    # UPPER(name::text) LIKE ..., как и поиск ингредиентов.
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX recipe_name_upper_like_idx '
+            'ON recipes_recipe (UPPER(name::text) text_pattern_ops)'
+        )
+
+
+def drop_recipe_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX recipe_name_upper_like_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_shoppingcart_servings'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            create_recipe_search_index, drop_recipe_search_index
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.3 on 2026-10-19 02:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0014_recipe_name_search_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(db_index=True, upload_to='recipes/', verbose_name='Картинка'),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='avatar',
+            field=models.ImageField(blank=True, db_index=True, null=True, upload_to='avatars/', verbose_name='Аватар'),
+        ),
+    ]
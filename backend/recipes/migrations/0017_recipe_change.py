@@ -0,0 +1,27 @@
+# Generated by Django 3.2.3 on 2026-10-19 02:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0016_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipe_id', models.BigIntegerField(db_index=True, verbose_name='ID рецепта')),
+                ('action', models.CharField(choices=[('created', 'Создан'), ('updated', 'Изменён'), ('deleted', 'Удалён')], max_length=7, verbose_name='Действие')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата изменения')),
+            ],
+            options={
+                'verbose_name': 'Изменение рецепта',
+                'verbose_name_plural': 'Изменения рецептов',
+                'ordering': ('id',),
+            },
+        ),
+    ]
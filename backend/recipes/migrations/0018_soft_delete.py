@@ -0,0 +1,32 @@
+# Generated by Django 3.2.3 on 2026-10-19 02:46
+
+import django.contrib.auth.models
+from django.db import migrations, models
+import django.db.models.manager
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0017_recipe_change'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='user',
+            managers=[
+                ('objects', django.db.models.manager.Manager()),
+                ('all_objects', django.contrib.auth.models.UserManager()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Дата удаления'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Дата удаления'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+from django.db import migrations
+
+SEARCH_FIELDS = ('username', 'first_name', 'last_name', 'email')
+
+
+def create_user_search_indexes(apps, schema_editor):
+    # Поиск пользователей по началу полей (istartswith) выполняется как
+    # UPPER(field::text) LIKE ..., поэтому индексы строятся по выражению.
+    if schema_editor.connection.vendor == 'postgresql':
+        for field in SEARCH_FIELDS:
+            schema_editor.execute(
+                f'CREATE INDEX user_{field}_upper_like_idx '
+                f'ON recipes_user (UPPER({field}::text) text_pattern_ops)'
+            )
+
+
+def drop_user_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for field in SEARCH_FIELDS:
+            schema_editor.execute(f'DROP INDEX user_{field}_upper_like_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0018_soft_delete'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            create_user_search_indexes, drop_user_search_indexes
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.3 on 2026-10-19 03:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0019_user_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='shopping_list_version',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Версия списка покупок'),
+        ),
+    ]
@@ -1,11 +1,33 @@
-from django.db import models
-from django.contrib.auth.models import AbstractUser
+from django.db import models, transaction
+from django.contrib.auth.models import AbstractUser, UserManager
+
+
+class NotDeletedManagerMixin:
+    """Скрывает записи, помеченные на удаление (deleted_at не пуст).
+
+    Помеченные записи удаляются фоновой задачей, до этого они доступны
+    только через менеджер all_objects.
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
+class NotDeletedUserManager(NotDeletedManagerMixin, UserManager):
+    use_in_migrations = False
+
+
+class NotDeletedManager(NotDeletedManagerMixin, models.Manager):
+    pass
 
 
 class User(AbstractUser):
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ('username', 'first_name', 'last_name')
 
+    objects = NotDeletedUserManager()
+    all_objects = UserManager()
+
     first_name = models.CharField('Имя', max_length=150)
     last_name = models.CharField('Фамилия', max_length=150)
     email = models.EmailField('Электронная почта', max_length=254, unique=True)
@@ -13,7 +35,13 @@ class User(AbstractUser):
         'Аватар',
         upload_to='avatars/',
         blank=True,
-        null=True
+        null=True,
+        db_index=True
+    )
+    updated_at = models.DateTimeField('Дата изменения', auto_now=True)
+    deleted_at = models.DateTimeField('Дата удаления', null=True, blank=True)
+    shopping_list_version = models.PositiveIntegerField(
+        'Версия списка покупок', default=0, editable=False
     )
     subscribers = models.ManyToManyField(
         'User',
@@ -28,7 +56,8 @@ class User(AbstractUser):
     shopping_cart = models.ManyToManyField(
         'Recipe',
         verbose_name='Список покупок',
-        related_name='in_shopping_cart'
+        related_name='in_shopping_cart',
+        through='ShoppingCart'
     )
 
     class Meta:
@@ -53,10 +82,43 @@ class Subscribtions(models.Model):
         verbose_name='Подписчик'
     )
 
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'subscriber'),
+                name='unique_subscription'
+            ),
+        )
+
     def __str__(self):
         return f'подписчик {self.subscriber}'
 
 
+class ShoppingCart(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь'
+    )
+    recipe = models.ForeignKey(
+        'Recipe',
+        on_delete=models.CASCADE,
+        verbose_name='Рецепт'
+    )
+    servings = models.PositiveSmallIntegerField(
+        'Количество порций', default=1
+    )
+
+    class Meta:
+        db_table = 'recipes_user_shopping_cart'
+        unique_together = ('user', 'recipe')
+        verbose_name = 'Рецепт в списке покупок'
+        verbose_name_plural = 'Список покупок'
+
+    def __str__(self):
+        return f'{self.recipe} x {self.servings}'
+
+
 class Tag(models.Model):
     name = models.CharField('Название', max_length=32, unique=True)
     slug = models.SlugField('Слаг', max_length=32, unique=True)
@@ -97,20 +159,71 @@ class Recipe(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='recipes/',
+        db_index=True
     )
     name = models.CharField('Название', max_length=256)
     text = models.TextField('Описание')
     cooking_time = models.PositiveSmallIntegerField('Время приготовления')
-    short_link = models.CharField('Короткая ссылка', max_length=32)
+    short_link = models.CharField(
+        'Короткая ссылка', max_length=32, db_index=True
+    )
     pub_date = models.DateTimeField('Дата публикации', auto_now_add=True)
+    updated_at = models.DateTimeField(
+        'Дата изменения', auto_now=True, db_index=True
+    )
+    summary = models.JSONField('Сводка по составу', default=dict, blank=True)
+    deleted_at = models.DateTimeField('Дата удаления', null=True, blank=True)
+
+    objects = NotDeletedManager()
+    all_objects = models.Manager()
 
     def __str__(self) -> str:
         return self.name
 
+    @staticmethod
+    def build_summary(compositions):
+        """Строит сводку по составу рецепта.
+
+        compositions - пары (ингредиент, количество). Сводка содержит
+        число ингредиентов, суммарное количество по каждой единице
+        измерения, а также id ингредиентов и их количества в одном
+        порядке.
+        """
+        unit_totals = {}
+        ingredient_ids = []
+        amounts = []
+        for ingredient, amount in compositions:
+            unit = ingredient.measurement_unit
+            unit_totals[unit] = unit_totals.get(unit, 0) + amount
+            ingredient_ids.append(ingredient.id)
+            amounts.append(amount)
+        return {
+            'ingredients_count': len(ingredient_ids),
+            'unit_totals': dict(sorted(unit_totals.items())),
+            'ingredient_ids': ingredient_ids,
+            'amounts': amounts,
+        }
+
+    def refresh_summary(self):
+        """Пересчитывает сводку по сохранённому в БД составу."""
+        self.summary = self.build_summary(
+            (composition.ingredient, composition.amount)
+            for composition in
+            self.composition.select_related('ingredient').order_by('id')
+        )
+        self.save(update_fields=('summary', 'updated_at'))
+
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-pub_date',)
+        indexes = (
+            models.Index(fields=('-pub_date',), name='recipe_pub_date_idx'),
+            models.Index(
+                fields=('author', '-pub_date'),
+                name='recipe_author_pub_date_idx'
+            ),
+        )
 
 
 class RecipeComposition(models.Model):
@@ -134,3 +247,41 @@ class RecipeComposition(models.Model):
     class Meta:
         verbose_name = 'Состав рецепта'
         verbose_name_plural = 'Состав рецепта'
+
+
+class RecipeChange(models.Model):
+    """Журнал изменений рецептов для инкрементальной синхронизации.
+
+    id записи служит курсором ленты изменений. Записи добавляются после
+    фиксации транзакции, удаление рецепта сохраняется как надгробие
+    (action = deleted), поэтому recipe_id не является внешним ключом.
+    """
+    CREATED = 'created'
+    UPDATED = 'updated'
+    DELETED = 'deleted'
+    ACTIONS = (
+        (CREATED, 'Создан'),
+        (UPDATED, 'Изменён'),
+        (DELETED, 'Удалён'),
+    )
+
+    recipe_id = models.BigIntegerField('ID рецепта', db_index=True)
+    action = models.CharField('Действие', max_length=7, choices=ACTIONS)
+    created_at = models.DateTimeField('Дата изменения', auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.recipe_id}: {self.action}'
+
+    @classmethod
+    def record(cls, recipe_ids, action):
+        """Записывает изменение рецептов после фиксации транзакции."""
+        recipe_ids = list(recipe_ids)
+        transaction.on_commit(lambda: cls.objects.bulk_create(
+            cls(recipe_id=recipe_id, action=action)
+            for recipe_id in recipe_ids
+        ))
+
+    class Meta:
+        verbose_name = 'Изменение рецепта'
+        verbose_name_plural = 'Изменения рецептов'
+        ordering = ('id',)
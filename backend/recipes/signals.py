@@ -0,0 +1,92 @@
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from api.utils import invalidate_ingredient_shopping_lists, touch_recipes
+
+from .models import (Ingredient, Recipe, RecipeChange, RecipeComposition, Tag,
+                     User)
+
+FILE_FIELDS = {
+    Recipe: ('image',),
+    User: ('avatar',),
+}
+
+
+@receiver(pre_save, sender=Recipe)
+@receiver(pre_save, sender=User)
+def remember_files(sender, instance, using, update_fields=None, **kwargs):
+    """Запоминает файлы, на которые запись ссылалась до сохранения."""
+    fields = FILE_FIELDS[sender]
+    if update_fields is not None:
+        fields = [field for field in fields if field in update_fields]
+    instance._previous_files = {}
+    if instance.pk and fields:
+        instance._previous_files = (
+            sender._default_manager.using(using)
+            .filter(pk=instance.pk).values(*fields).first()
+        ) or {}
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=User)
+def release_replaced_files(sender, instance, **kwargs):
+    """Освобождает файлы, заменённые при сохранении записи."""
+    for field, name in getattr(instance, '_previous_files', {}).items():
+        file = getattr(instance, field)
+        if name and name != file.name:
+            file.storage.delete(name)
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=User)
+def release_files(sender, instance, **kwargs):
+    """Освобождает файлы удалённой записи."""
+    for field in FILE_FIELDS[sender]:
+        file = getattr(instance, field)
+        if file:
+            file.storage.delete(file.name)
+
+
+@receiver(post_save, sender=Recipe)
+def record_saved_recipe(sender, instance, created, **kwargs):
+    RecipeChange.record(
+        (instance.pk,),
+        RecipeChange.CREATED if created else RecipeChange.UPDATED
+    )
+
+
+@receiver(post_delete, sender=Recipe)
+def record_deleted_recipe(sender, instance, **kwargs):
+    if instance.deleted_at is None:
+        # Для помеченных на удаление рецептов надгробие уже записано.
+        RecipeChange.record((instance.pk,), RecipeChange.DELETED)
+
+
+@receiver(post_save, sender=Ingredient)
+def invalidate_ingredient(sender, instance, created, **kwargs):
+    """Название и единица измерения ингредиента входят в закешированные
+    списки покупок и в ответы с рецептами."""
+    if not created:
+        invalidate_ingredient_shopping_lists(instance.pk)
+        touch_recipes(
+            RecipeComposition.objects.filter(ingredient_id=instance.pk)
+            .values_list('recipe_id', flat=True)
+        )
+
+
+@receiver(post_save, sender=Tag)
+def invalidate_tag(sender, instance, created, **kwargs):
+    """Название и слаг тега входят в ответы с рецептами."""
+    if not created:
+        touch_recipes(
+            Recipe.tags.through.objects.filter(tag_id=instance.pk)
+            .values_list('recipe_id', flat=True)
+        )
+
+
+# Связи с рецептами удаляются раньше самого тега, поэтому рецепты
+# обновляются до удаления, в той же транзакции.
+@receiver(pre_delete, sender=Tag)
+def invalidate_deleted_tag(sender, instance, **kwargs):
+    invalidate_tag(sender, instance, created=False)
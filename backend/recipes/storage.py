@@ -0,0 +1,122 @@
+import hashlib
+import os
+import re
+import tempfile
+import time
+import uuid
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import FileField
+
+CONTENT_ADDRESSED_NAME = re.compile(
+    r'^[\w-]+/[0-9a-f]{2}/[0-9a-f]{64}(\.\w+)?$'
+)
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, в котором имя файла определяется его содержимым.
+
+    Файл сохраняется как <каталог>/<aa>/<sha256><расширение>, где
+    каталог берётся из upload_to поля. Одинаковые загрузки хранятся
+    один раз, а URL файла никогда не меняет содержимое, поэтому его
+    можно отдавать с Cache-Control: immutable.
+
+    Так как один файл может использоваться несколькими записями,
+    delete() удаляет его только после фиксации транзакции и только
+    если на файл больше не ссылается ни одна запись.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    @staticmethod
+    def is_content_addressed(name):
+        return bool(CONTENT_ADDRESSED_NAME.match(name))
+
+    def _save(self, name, content):
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        os.makedirs(self.path(directory), exist_ok=True)
+        digest = hashlib.sha256()
+        with tempfile.NamedTemporaryFile(
+            dir=self.path(directory), prefix='.upload-', delete=False
+        ) as temporary:
+            for chunk in content.chunks():
+                digest.update(chunk)
+                temporary.write(chunk)
+        hexdigest = digest.hexdigest()
+        name = f'{directory}/{hexdigest[:2]}/{hexdigest}{extension}'
+        try:
+            try:
+                # Обновляем дату изменения, чтобы ни gcmedia, ни
+                # delete_unreferenced() не удалили файл, ссылка на который
+                # ещё не зафиксирована в БД.
+                os.utime(self.path(name))
+                return name
+            except FileNotFoundError:
+                pass
+            os.makedirs(os.path.dirname(self.path(name)), exist_ok=True)
+            os.chmod(temporary.name, self.file_permissions_mode or 0o644)
+            os.replace(temporary.name, self.path(name))
+        finally:
+            if os.path.exists(temporary.name):
+                os.remove(temporary.name)
+        return name
+
+    def get_file_fields(self):
+        """Возвращает поля моделей, хранящие файлы в этом хранилище."""
+        return [
+            field
+            for model in apps.get_models()
+            for field in model._meta.concrete_fields
+            if isinstance(field, FileField)
+            and isinstance(field.storage, ContentAddressedStorage)
+        ]
+
+    def is_referenced(self, name):
+        """Учитывает и записи, помеченные на удаление: их файлы
+        освобождаются только после удаления самих записей."""
+        return any(
+            field.model._base_manager.using(DEFAULT_DB_ALIAS)
+            .filter(**{field.name: name}).exists()
+            for field in self.get_file_fields()
+        )
+
+    def delete_unreferenced(self, name):
+        """Удаляет файл, если на него не ссылается ни одна запись.
+        Возвращает True, если файл удалён.
+
+        Пока транзакция, переиспользовавшая файл в _save(), не
+        зафиксирована, ссылки на него в БД не видно. Поэтому файл,
+        изменённый менее MEDIA_DELETE_GRACE_PERIOD секунд назад, не
+        удаляется (его удалит gcmedia). Чтобы _save() не обновил дату
+        изменения между её проверкой и удалением, файл сначала
+        переименовывается: после переименования _save() его уже не
+        найдёт и запишет заново, а обновлённая до переименования дата
+        будет видна при проверке, и файл вернётся на место.
+        """
+        if not name or self.is_referenced(name):
+            return False
+        if not self.is_content_addressed(name):
+            super().delete(name)
+            return True
+        path = self.path(name)
+        trash = os.path.join(
+            os.path.dirname(path), f'.delete-{uuid.uuid4().hex}'
+        )
+        try:
+            os.rename(path, trash)
+        except FileNotFoundError:
+            return False
+        if (time.time() - os.stat(trash).st_mtime
+                < settings.MEDIA_DELETE_GRACE_PERIOD):
+            os.replace(trash, path)
+            return False
+        os.remove(trash)
+        return True
+
+    def delete(self, name):
+        transaction.on_commit(lambda: self.delete_unreferenced(name))
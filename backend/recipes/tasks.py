@@ -0,0 +1 @@
+from .deletion import purge_recipes, purge_user  # noqa
@@ -0,0 +1,17 @@
+from recipes.admin import EstimatedCountPaginator
+from recipes.models import Recipe, User
+
+
+def test_soft_delete_filter_does_not_disable_estimate():
+    assert EstimatedCountPaginator.is_unfiltered(Recipe.objects.all())
+    assert EstimatedCountPaginator.is_unfiltered(User.objects.all())
+    assert EstimatedCountPaginator.is_unfiltered(Recipe.all_objects.all())
+
+
+def test_other_filters_disable_estimate():
+    assert not EstimatedCountPaginator.is_unfiltered(
+        Recipe.objects.filter(name='Рецепт')
+    )
+    assert not EstimatedCountPaginator.is_unfiltered(
+        Recipe.all_objects.filter(deleted_at__isnull=False)
+    )
@@ -0,0 +1,75 @@
+import os
+import time
+
+import pytest
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+from recipes import storage as storage_module
+
+CONTENT = b'image'
+
+
+@pytest.fixture
+def old_file(db):
+    """Файл, который давно не изменялся и на который нет ссылок."""
+    name = default_storage.save('recipes/image.png', ContentFile(CONTENT))
+    old = time.time() - 3600
+    os.utime(default_storage.path(name), (old, old))
+    yield name
+    default_storage.delete_unreferenced(name)
+
+
+def save_again():
+    return default_storage.save('recipes/other.png', ContentFile(CONTENT))
+
+
+def test_unreferenced_file_is_deleted(old_file):
+    assert default_storage.delete_unreferenced(old_file)
+    assert not default_storage.exists(old_file)
+
+
+def test_reused_file_is_kept(old_file):
+    """_save() переиспользовал файл, но ссылка на него ещё не
+    зафиксирована, когда другая транзакция освобождает файл."""
+    assert save_again() == old_file
+    assert not default_storage.delete_unreferenced(old_file)
+    assert default_storage.exists(old_file)
+
+
+def test_reuse_between_check_and_delete(old_file, monkeypatch):
+    """_save() обновляет дату изменения после того, как
+    delete_unreferenced() её проверил: файл переименован, поэтому _save()
+    записывает его заново."""
+    rename = os.rename
+
+    def rename_then_save(source, destination):
+        rename(source, destination)
+        assert save_again() == old_file
+
+    monkeypatch.setattr(storage_module.os, 'rename', rename_then_save)
+    assert default_storage.delete_unreferenced(old_file)
+    with default_storage.open(old_file) as file:
+        assert file.read() == CONTENT
+
+
+def test_reuse_before_rename(old_file, monkeypatch):
+    """_save() обновил дату изменения до переименования: файл
+    возвращается на место."""
+    rename = os.rename
+
+    def save_then_rename(source, destination):
+        assert save_again() == old_file
+        rename(source, destination)
+
+    monkeypatch.setattr(storage_module.os, 'rename', save_then_rename)
+    assert not default_storage.delete_unreferenced(old_file)
+    assert default_storage.exists(old_file)
+
+
+def test_soft_deleted_records_keep_files(old_file, user):
+    user.avatar = old_file
+    user.save()
+    type(user).objects.filter(pk=user.pk).update(deleted_at=timezone.now())
+    assert default_storage.is_referenced(old_file)
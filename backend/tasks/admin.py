@@ -0,0 +1,13 @@
+from django.contrib import admin
+
+from .models import Task
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('name', 'status', 'attempts', 'user', 'created',
+                    'finished')
+    list_filter = ('status', 'name')
+    list_select_related = ('user',)
+    readonly_fields = ('args', 'kwargs', 'result', 'progress', 'error',
+                       'attempts', 'created', 'started', 'finished')
@@ -0,0 +1,98 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import django
+from django.conf import settings
+from django.db import connections
+from django.utils.module_loading import import_string
+
+
+class ImmediateBackend:
+    """Выполняет задачу сразу в текущем потоке. Используется в тестах
+    и при отладке."""
+
+    def submit(self, task_id, delay=0):
+        from .runner import run_task
+        run_task(task_id)
+
+
+class DatabaseBackend:
+    """Только сохраняет задачу в БД: её выполняет отдельный процесс
+    manage.py runtasks."""
+
+    def submit(self, task_id, delay=0):
+        pass
+
+
+def run_in_worker(task_id):
+    from .runner import run_task
+    try:
+        run_task(task_id)
+    finally:
+        connections.close_all()
+
+
+class ThreadPoolBackend:
+    """Выполняет задачи в пуле потоков текущего процесса.
+
+    Размер пула ограничивает число одновременно выполняемых задач.
+    Очередь пула хранится в памяти, поэтому задачи, не выполненные
+    к перезапуску процесса, выполнит только manage.py runtasks.
+    """
+    executor_class = ThreadPoolExecutor
+
+    def __init__(self):
+        self.executor = self.get_executor()
+
+    def get_executor(self):
+        return self.executor_class(
+            max_workers=settings.TASKS['CONCURRENCY'],
+            thread_name_prefix='tasks'
+        )
+
+    def submit(self, task_id, delay=0):
+        if delay:
+            timer = threading.Timer(delay, self.submit, (task_id,))
+            timer.daemon = True
+            timer.start()
+        else:
+            self.executor.submit(run_in_worker, task_id)
+
+
+class ProcessPoolBackend(ThreadPoolBackend):
+    """Выполняет задачи в пуле процессов.
+
+    Процессы запускаются методом spawn и заново инициализируют Django,
+    чтобы не разделять соединения с БД с родительским процессом.
+    """
+
+    def get_executor(self):
+        return ProcessPoolExecutor(
+            max_workers=settings.TASKS['CONCURRENCY'],
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=django.setup
+        )
+
+
+BACKENDS = {
+    'immediate': ImmediateBackend,
+    'database': DatabaseBackend,
+    'thread': ThreadPoolBackend,
+    'process': ProcessPoolBackend,
+}
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            backend = settings.TASKS['BACKEND']
+            backend_class = (
+                BACKENDS[backend] if backend in BACKENDS
+                else import_string(backend)
+            )
+            _backend = backend_class()
+        return _backend
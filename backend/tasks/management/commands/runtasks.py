@@ -0,0 +1,60 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from tasks.backends import run_in_worker
+from tasks.models import Task
+
+
+class Command(BaseCommand):
+    help = 'Выполняет задачи из очереди в БД'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Выполнить задачи, готовые к запуску, и завершиться'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=1.0,
+            help='Интервал опроса очереди в секундах'
+        )
+        parser.add_argument(
+            '--stale-after',
+            type=int,
+            default=3600,
+            help='Через сколько секунд задача в статусе running '
+                 'считается прерванной и возвращается в очередь'
+        )
+
+    def requeue_stale(self, stale_after):
+        return Task.objects.filter(
+            status=Task.RUNNING,
+            started__lt=timezone.now() - timedelta(seconds=stale_after)
+        ).update(status=Task.PENDING)
+
+    def handle(self, *args, **options):
+        concurrency = settings.TASKS['CONCURRENCY']
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            while True:
+                requeued = self.requeue_stale(options['stale_after'])
+                if requeued:
+                    self.stdout.write(f'Возвращено в очередь: {requeued}')
+                task_ids = list(
+                    Task.objects
+                    .filter(status=Task.PENDING, run_after__lte=timezone.now())
+                    .order_by('run_after')
+                    .values_list('id', flat=True)[:concurrency]
+                )
+                list(executor.map(run_in_worker, task_ids))
+                if options['once'] and not task_ids:
+                    break
+                if not task_ids:
+                    time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS('Очередь задач обработана'))
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.3 on 2026-10-19 02:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='progress',
+            field=models.JSONField(blank=True, null=True, verbose_name='Прогресс'),
+        ),
+    ]
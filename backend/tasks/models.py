@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+
+
+class Task(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    SUCCESS = 'success'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (SUCCESS, 'Выполнена'),
+        (FAILED, 'Ошибка'),
+    )
+
+    name = models.CharField('Название', max_length=128)
+    args = models.JSONField('Аргументы', default=list, blank=True)
+    kwargs = models.JSONField('Именованные аргументы', default=dict,
+                              blank=True)
+    status = models.CharField(
+        'Статус', max_length=16, choices=STATUSES, default=PENDING
+    )
+    attempts = models.PositiveSmallIntegerField('Попытки', default=0)
+    max_retries = models.PositiveSmallIntegerField(
+        'Максимум повторов', default=0
+    )
+    result = models.JSONField('Результат', null=True, blank=True)
+    progress = models.JSONField('Прогресс', null=True, blank=True)
+    error = models.TextField('Ошибка', blank=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='tasks',
+        verbose_name='Пользователь',
+        null=True,
+        blank=True
+    )
+    created = models.DateTimeField('Создана', auto_now_add=True)
+    run_after = models.DateTimeField('Выполнить после', default=timezone.now)
+    started = models.DateTimeField('Начата', null=True, blank=True)
+    finished = models.DateTimeField('Завершена', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Задача'
+        verbose_name_plural = 'Задачи'
+        ordering = ('-created',)
+        indexes = (
+            models.Index(
+                fields=('status', 'run_after'),
+                name='task_status_run_after_idx'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.name} #{self.id} ({self.status})'
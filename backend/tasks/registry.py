@@ -0,0 +1,37 @@
+REGISTRY = {}
+
+
+class RegisteredTask:
+    """Функция, зарегистрированная как фоновая задача."""
+
+    def __init__(self, func, name, max_retries):
+        self.func = func
+        self.name = name
+        self.max_retries = max_retries
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def delay(self, *args, user=None, **kwargs):
+        """Ставит задачу в очередь и возвращает объект Task."""
+        from .runner import enqueue
+        return enqueue(self, args, kwargs, user=user)
+
+
+def task(name=None, max_retries=None):
+    """Декоратор, регистрирующий функцию как фоновую задачу.
+
+    Аргументы и результат функции должны сериализоваться в JSON.
+    """
+    from django.conf import settings
+
+    def decorator(func):
+        registered = RegisteredTask(
+            func,
+            name or f'{func.__module__}.{func.__name__}',
+            settings.TASKS['MAX_RETRIES']
+            if max_retries is None else max_retries
+        )
+        REGISTRY[registered.name] = registered
+        return registered
+    return decorator
@@ -0,0 +1,90 @@
+import logging
+import traceback
+from contextvars import ContextVar
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .backends import get_backend
+from .models import Task
+from .registry import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# id задачи, выполняемой в текущем потоке, None вне задачи.
+current_task_id = ContextVar('current_task_id', default=None)
+
+
+def enqueue(registered, args, kwargs, user=None):
+    """Сохраняет задачу в БД и передаёт её бэкенду после фиксации
+    транзакции."""
+    task = Task.objects.create(
+        name=registered.name,
+        args=list(args),
+        kwargs=kwargs,
+        max_retries=registered.max_retries,
+        user=user
+    )
+    transaction.on_commit(lambda: get_backend().submit(task.id))
+    return task
+
+
+def claim(task_id):
+    """Переводит задачу в статус running, если она ещё в очереди.
+
+    Возвращает True, если задачу захватил текущий исполнитель.
+    """
+    return bool(
+        Task.objects
+        .filter(pk=task_id, status=Task.PENDING)
+        .update(
+            status=Task.RUNNING,
+            started=timezone.now(),
+            attempts=F('attempts') + 1
+        )
+    )
+
+
+def report_progress(progress):
+    """Сохраняет прогресс выполняемой задачи (JSON-совместимое
+    значение). Вне задачи ничего не делает."""
+    task_id = current_task_id.get()
+    if task_id is not None:
+        Task.objects.filter(pk=task_id).update(progress=progress)
+
+
+def run_task(task_id):
+    """Выполняет задачу и сохраняет результат.
+
+    При ошибке задача возвращается в очередь с экспоненциальной
+    задержкой, пока не исчерпано число повторов.
+    """
+    if not claim(task_id):
+        return
+    task = Task.objects.get(pk=task_id)
+    token = current_task_id.set(task_id)
+    try:
+        result = REGISTRY[task.name](*task.args, **task.kwargs)
+    except Exception:
+        logger.exception('Задача %s завершилась с ошибкой', task)
+        task.error = traceback.format_exc()
+        if task.attempts <= task.max_retries:
+            delay = 2 ** task.attempts
+            task.status = Task.PENDING
+            task.run_after = timezone.now() + timedelta(seconds=delay)
+            task.save(update_fields=('status', 'run_after', 'error'))
+        else:
+            task.status = Task.FAILED
+            task.finished = timezone.now()
+            task.save(update_fields=('status', 'finished', 'error'))
+    else:
+        task.status = Task.SUCCESS
+        task.result = result
+        task.finished = timezone.now()
+        task.save(update_fields=('status', 'result', 'finished'))
+    finally:
+        current_task_id.reset(token)
+    if task.status == Task.PENDING:
+        get_backend().submit(task.id, delay=2 ** task.attempts)